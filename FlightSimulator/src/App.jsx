@@ -20,7 +20,8 @@ function App() {
     const storedId = localStorage.getItem("passenger_id");
     const storedName = localStorage.getItem("full_name");
     const storedEmail = localStorage.getItem("email");
-    if (storedId) {
+    // no token means the session is over, whatever else is stored
+    if (storedId && localStorage.getItem("access_token")) {
       setPassenger({
         passenger_id: storedId,
         full_name: storedName,
@@ -35,6 +36,7 @@ function App() {
     localStorage.setItem("passenger_id", data.passenger_id);
     localStorage.setItem("full_name", data.full_name);
     localStorage.setItem("email", data.email);
+    localStorage.setItem("access_token", data.access_token);
   };
   //console.log("Current Passenger:", passenger);
   return (
@@ -12,6 +12,13 @@ return res.json()
 }
 
 
+// Bearer token issued at login; protected endpoints reject requests without it
+export function authHeaders(extra = {}) {
+  const token = localStorage.getItem("access_token");
+  return token ? { ...extra, Authorization: `Bearer ${token}` } : extra;
+}
+
+
 
 export async function searchFlights(origin, destination, travel_date, sort_by, order) {
   try {
@@ -50,7 +57,7 @@ export async function bookFlight(payload, tripType = "oneway") {
 
   const res = await fetch(endpoint, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: authHeaders({ "Content-Type": "application/json" }),
     body: JSON.stringify(payload),
   });
 
@@ -61,16 +68,22 @@ export async function bookFlight(payload, tripType = "oneway") {
 export async function payBooking(pnr) {
   const res = await fetch(`${BACKEND}/bookings/${pnr}/pay`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: authHeaders({ "Content-Type": "application/json" }),
   });
   return handleRes(res);
 }
 
 
-export async function getBookings(passenger_id) {
-  const res = await fetch(`${BACKEND}/bookings?passenger_id=${passenger_id}`);
+// One page of bookings (newest first); pass the returned nextCursor to get the next page.
+// nextCursor is null on the last page.
+export async function getBookings(passenger_id, cursor = null) {
+  const params = new URLSearchParams({ passenger_id });
+  if (cursor) params.append("cursor", cursor);
+  const res = await fetch(`${BACKEND}/bookings?${params.toString()}`, {
+    headers: authHeaders(),
+  });
   if (!res.ok) throw new Error("Failed to load bookings");
-  return res.json();
+  return { bookings: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
 }
 
 
@@ -82,13 +95,29 @@ export async function cancelBooking(pnr, leg = null) {
 
   const res = await fetch(url, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: authHeaders({ "Content-Type": "application/json" }),
   });
 
   return handleRes(res);
 }
 
 
+export async function getBooking(pnr) {
+  const res = await fetch(`${BACKEND}/bookings/${pnr}`, { headers: authHeaders() });
+  return handleRes(res);
+}
+
+
+export async function logout() {
+  // revoke the token server-side; the caller clears local state either way
+  const res = await fetch(`${BACKEND}/passengers/logout`, {
+    method: "POST",
+    headers: authHeaders(),
+  });
+  return res.ok;
+}
+
+
 export async function getFlightById(flight_id) {
   const res = await fetch(`${BACKEND}/flights/${flight_id}`);
   return handleRes(res);
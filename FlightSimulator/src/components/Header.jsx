@@ -1,5 +1,6 @@
 import React, { useEffect } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import { logout } from "../api/api";
 
 export default function Header({ passenger, setPassenger }) {
   const navigate = useNavigate();
@@ -9,8 +10,9 @@ export default function Header({ passenger, setPassenger }) {
     const storedPassenger = localStorage.getItem("full_name");
     const storedEmail = localStorage.getItem("email");
     const storedId = localStorage.getItem("passenger_id");
+    const storedToken = localStorage.getItem("access_token");
 
-    if (storedPassenger && storedEmail && storedId) {
+    if (storedPassenger && storedEmail && storedId && storedToken) {
       setPassenger({
         full_name: storedPassenger,
         email: storedEmail,
@@ -20,7 +22,13 @@ export default function Header({ passenger, setPassenger }) {
   }, [setPassenger]);
 
   // ✅ Logout clears everything
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    try {
+      await logout();
+    } catch (e) {
+      // offline: the token still expires on its own
+    }
+    localStorage.removeItem("access_token");
     localStorage.removeItem("passenger_id");
     localStorage.removeItem("full_name");
     localStorage.removeItem("email");
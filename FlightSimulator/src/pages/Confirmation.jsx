@@ -3,6 +3,7 @@ import { useLocation, useParams, Link } from "react-router-dom";
 import jsPDF from "jspdf";
 import autoTable from "jspdf-autotable";
 import { BACKEND } from "../config.js";
+import { authHeaders } from "../api/api";
 import logo from "../assets/logo.png";
 
 export default function Confirmation() {
@@ -18,7 +19,7 @@ export default function Confirmation() {
       if (!pnr) return;
       setLoading(true);
       try {
-        const res = await fetch(`${BACKEND}/bookings/${pnr}`);
+        const res = await fetch(`${BACKEND}/bookings/${pnr}`, { headers: authHeaders() });
         if (!res.ok) throw new Error("Failed to fetch booking");
         const data = await res.json();
         console.log("🛰️ Booking API Response:", data);
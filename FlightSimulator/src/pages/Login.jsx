@@ -22,8 +22,9 @@ export default function Login({ onLogin }) {
       const data = await res.json();
       if (!res.ok) throw new Error(data.detail || "Login failed");
 
-      // ✅ Save passenger info in localStorage for persistence
-      localStorage.setItem("passenger", JSON.stringify(data));
+      // ✅ Save passenger info in localStorage for persistence (the token is stored by onLogin)
+      const { access_token, token_type, expires_at, ...passenger } = data;
+      localStorage.setItem("passenger", JSON.stringify(passenger));
       
 
       // ✅ Update state in App (triggers Header update)
@@ -11,10 +11,55 @@ export default function MyBookings({ passenger }) {
   const [showChoiceModal, setShowChoiceModal] = useState(false);
   const [selectedBooking, setSelectedBooking] = useState(null);
   const [cancelling, setCancelling] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const navigate = useNavigate();
 
-  // 🧩 Reusable function to fetch, sort, and group bookings
+  // 🧩 Fetch one page of bookings (the server pages over PNRs), then sort and group it
+  async function fetchPage(id, cursor) {
+    const { bookings: data, nextCursor: next } = await getBookings(id, cursor);
+    if (!Array.isArray(data)) return { grouped: [], next: null };
+
+    // ✅ Sort bookings by latest date
+    const sorted = [...data].sort((a, b) => {
+      const dateA = new Date(a.booking_date || a.created_at || 0);
+      const dateB = new Date(b.booking_date || b.created_at || 0);
+      return dateB - dateA;
+    });
+
+    // ✅ Group bookings by PNR
+    const grouped = Object.values(
+      sorted.reduce((acc, b) => {
+        const key = b.pnr || "UNKNOWN";
+        if (!acc[key]) {
+          acc[key] = {
+            ...b,
+            passengers: [
+              {
+                full_name:
+                  b.passenger_name || b.full_name || "Unknown Passenger",
+                seat_no: b.seat_no || "-",
+              },
+            ],
+          };
+        } else {
+          acc[key].passengers.push({
+            full_name:
+              b.passenger_name || b.full_name || "Unknown Passenger",
+            seat_no: b.seat_no || "-",
+          });
+          acc[key].fare_paid += b.fare_paid || 0;
+        }
+        return acc;
+      }, {})
+    );
+
+    return { grouped, next };
+  }
+
+  // 🧩 Reusable function to (re)load bookings; a reload fetches as many pages
+  // as are on screen, so a refetch after cancelling doesn't drop older bookings
   async function fetchAndSetBookings() {
     const id = passenger?.passenger_id || localStorage.getItem("passenger_id");
     if (!id) {
@@ -25,47 +70,16 @@ export default function MyBookings({ passenger }) {
     setLoading(true);
     setError(null);
     try {
-      const data = await getBookings(id);
-      if (!Array.isArray(data)) {
-        setBookings([]);
-        return;
-      }
-
-      // ✅ Sort bookings by latest date
-      const sorted = [...data].sort((a, b) => {
-        const dateA = new Date(a.booking_date || a.created_at || 0);
-        const dateB = new Date(b.booking_date || b.created_at || 0);
-        return dateB - dateA;
-      });
+      let all = [];
+      let cursor = null;
+      do {
+        const page = await fetchPage(id, cursor);
+        all = all.concat(page.grouped);
+        cursor = page.next;
+      } while (cursor && all.length < bookings.length);
 
-      // ✅ Group bookings by PNR
-      const grouped = Object.values(
-        sorted.reduce((acc, b) => {
-          const key = b.pnr || "UNKNOWN";
-          if (!acc[key]) {
-            acc[key] = {
-              ...b,
-              passengers: [
-                {
-                  full_name:
-                    b.passenger_name || b.full_name || "Unknown Passenger",
-                  seat_no: b.seat_no || "-",
-                },
-              ],
-            };
-          } else {
-            acc[key].passengers.push({
-              full_name:
-                b.passenger_name || b.full_name || "Unknown Passenger",
-              seat_no: b.seat_no || "-",
-            });
-            acc[key].fare_paid += b.fare_paid || 0;
-          }
-          return acc;
-        }, {})
-      );
-
-      setBookings(grouped);
+      setBookings(all);
+      setNextCursor(cursor);
     } catch (e) {
       console.error("❌ Failed to fetch bookings:", e);
       setError(e.message);
@@ -74,6 +88,23 @@ export default function MyBookings({ passenger }) {
     }
   }
 
+  // 🧩 Append the next page of older bookings
+  async function loadMore() {
+    const id = passenger?.passenger_id || localStorage.getItem("passenger_id");
+    if (!id || !nextCursor) return;
+
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(id, nextCursor);
+      setBookings((prev) => [...prev, ...page.grouped]);
+      setNextCursor(page.next);
+    } catch (e) {
+      alert("Failed to load more bookings: " + e.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   // 🧩 Fetch bookings on mount or passenger change
   useEffect(() => {
     if (passenger) fetchAndSetBookings();
@@ -212,6 +243,22 @@ export default function MyBookings({ passenger }) {
             </div>
           </div>
         ))}
+
+        {nextCursor && (
+          <div className="text-center">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className={`px-4 py-2 text-white rounded-lg ${
+                loadingMore
+                  ? "bg-blue-300 cursor-not-allowed"
+                  : "bg-blue-600 hover:bg-blue-700"
+              }`}
+            >
+              {loadingMore ? "Loading..." : "Load more bookings"}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* 🧩 Cancel Options Modal */}
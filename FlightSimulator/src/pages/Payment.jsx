@@ -51,6 +51,18 @@ export default function Payment() {
       // ✅ Call your backend’s payment endpoint
       console.log("💳 Initiating payment for PNR:", bookingPNR);
       const response = await payBooking(bookingPNR);
+      if (response?.status === "PAYMENT_FAILED") {
+        throw new Error("Your payment was declined and the seats were released.");
+      }
+
+      // ✅ Round trips on different airlines carry a second PNR for the return leg
+      const returnPNR = booking?.return_pnr || booking?.bookings?.[0]?.return_pnr || null;
+      if (returnPNR && returnPNR !== bookingPNR) {
+        const returnResponse = await payBooking(returnPNR);
+        if (returnResponse?.status === "PAYMENT_FAILED") {
+          throw new Error("Payment for the return flight was declined and its seats were released.");
+        }
+      }
 
       // ✅ Extract the new confirmed PNR
       const pnrFromBackend =
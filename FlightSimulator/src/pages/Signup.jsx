@@ -1,9 +1,11 @@
 import { useState } from "react";
+import { useNavigate } from "react-router-dom";
 import { BACKEND } from "../config.js";
 
 export default function Signup({ onLogin }) {
   const [form, setForm] = useState({ full_name: "", email: "", phone: "", password: "" });
   const [error, setError] = useState("");
+  const navigate = useNavigate();
 
   const handleChange = (e) => setForm({ ...form, [e.target.name]: e.target.value });
 
@@ -19,7 +21,8 @@ export default function Signup({ onLogin }) {
       if (!res.ok) throw new Error(data?.detail || data?.message || "Signup failed");
       
       alert("Signup successful! You can now login.");
-      onLogin(data);  // optional: automatically log in after signup
+      // signup doesn't issue a session token, so send them to log in
+      navigate("/login");
     } catch (err) {
       setError(err.message);
     }
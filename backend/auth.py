@@ -0,0 +1,214 @@
+# auth.py
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Header, HTTPException
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
+from database import engine
+import models
+
+# -------------------------
+# Configuration
+# -------------------------
+# signs access tokens; every worker must share it for tokens to work across them
+AUTH_SECRET = os.getenv("AUTH_SECRET", "")
+AUTH_TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", str(12 * 3600)))
+# verified tokens remembered per worker, so repeat requests skip decoding and the HMAC
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# how often each worker picks up logouts handled by the other workers
+AUTH_REVOCATION_POLL_SECONDS = float(os.getenv("AUTH_REVOCATION_POLL_SECONDS", "5"))
+# revoked_tokens ids can commit out of order, so every poll re-reads this many ids back
+AUTH_REVOCATION_POLL_OVERLAP = 100
+
+if not AUTH_SECRET:
+    print("AUTH_SECRET is not set; using a random key (tokens won't survive a restart or work across workers)")
+    AUTH_SECRET = secrets.token_hex(32)
+
+_key = AUTH_SECRET.encode()
+revoked_t = models.RevokedToken.__table__
+
+
+class InvalidToken(Exception):
+    """
+    Malformed, forged, expired or revoked access token.
+    """
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_key, payload.encode(), hashlib.sha256).digest())
+
+
+# -------------------------
+# Tokens
+# -------------------------
+class TokenStore:
+    """
+    Issues and checks stateless HMAC-signed tokens ("<payload>.<signature>").
+    Verified tokens are kept in a bounded per-worker LRU. Revocations are written to
+    the revoked_tokens table and polled into every worker's memory at most
+    AUTH_REVOCATION_POLL_SECONDS apart; each is kept until the token would have expired anyway.
+    """
+
+    def __init__(self, ttl_seconds: int = AUTH_TOKEN_TTL_SECONDS, cache_size: int = AUTH_TOKEN_CACHE_SIZE,
+                 poll_seconds: float = AUTH_REVOCATION_POLL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._verified = OrderedDict()  # token -> claims
+        self._revoked = {}  # jti -> exp
+        self._last_revocation_id = 0  # newest revoked_tokens row seen
+        self._next_poll = 0.0
+        self.metrics = {"issued": 0, "cache_hits": 0, "verified": 0, "rejected": 0, "revoked": 0, "polls": 0}
+
+    def issue(self, passenger_id: int) -> dict:
+        now = int(time.time())
+        claims = {"sub": passenger_id, "iat": now, "exp": now + self.ttl_seconds, "jti": secrets.token_hex(8)}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        with self._lock:
+            self.metrics["issued"] += 1
+        return {"access_token": f"{payload}.{_sign(payload)}", "token_type": "bearer", "expires_at": claims["exp"]}
+
+    def verify(self, token: str) -> dict:
+        """
+        Claims of a valid token; raises InvalidToken otherwise.
+        """
+        now = time.time()
+        self.poll_revocations()
+        with self._lock:
+            claims = self._verified.get(token)
+            if claims is not None:
+                if claims["exp"] > now and claims["jti"] not in self._revoked:
+                    self._verified.move_to_end(token)
+                    self.metrics["cache_hits"] += 1
+                    return claims
+                del self._verified[token]
+
+        claims = self._check(token, now)
+        with self._lock:
+            self.metrics["verified"] += 1
+            self._verified[token] = claims
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return claims
+
+    def _check(self, token: str, now: float) -> dict:
+        try:
+            payload, signature = token.split(".")
+            if not hmac.compare_digest(signature, _sign(payload)):
+                raise InvalidToken("Bad signature")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, TypeError) as exc:
+            with self._lock:
+                self.metrics["rejected"] += 1
+            raise InvalidToken("Malformed token") from exc
+        except InvalidToken:
+            with self._lock:
+                self.metrics["rejected"] += 1
+            raise
+        with self._lock:
+            if claims["exp"] <= now or claims["jti"] in self._revoked:
+                self.metrics["rejected"] += 1
+                raise InvalidToken("Token expired or revoked")
+        return claims
+
+    def revoke(self, claims: dict):
+        now = time.time()
+        with self._lock:
+            self._revoked[claims["jti"]] = claims["exp"]
+            self.metrics["revoked"] += 1
+            # forget revocations of tokens that have expired since
+            for jti in [j for j, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[jti]
+        # shared with the other workers through the table
+        try:
+            with engine.begin() as conn:
+                conn.execute(delete(revoked_t).where(revoked_t.c.expires_at <= now))
+                conn.execute(insert(revoked_t).values(jti=claims["jti"], expires_at=claims["exp"]))
+        except IntegrityError:
+            pass  # revoked on another worker before this one polled it
+
+    def poll_revocations(self, force: bool = False):
+        """
+        Load revocations made by any worker since the last poll (at most every poll_seconds).
+        """
+        if not force and time.monotonic() < self._next_poll:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return  # another thread is polling
+        try:
+            self._next_poll = time.monotonic() + self.poll_seconds
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(revoked_t.c.id, revoked_t.c.jti, revoked_t.c.expires_at)
+                    .where(revoked_t.c.id > self._last_revocation_id - AUTH_REVOCATION_POLL_OVERLAP)
+                    .where(revoked_t.c.expires_at > time.time())
+                    .order_by(revoked_t.c.id)
+                ).all()
+            with self._lock:
+                self.metrics["polls"] += 1
+                for r in rows:
+                    self._revoked[r.jti] = r.expires_at
+                if rows:
+                    self._last_revocation_id = max(self._last_revocation_id, rows[-1].id)
+        except Exception as e:
+            print("Token revocation poll failed:", e)
+        finally:
+            self._poll_lock.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(
+                self.metrics,
+                cached=len(self._verified),
+                revocations=len(self._revoked),
+                ttl_seconds=self.ttl_seconds,
+            )
+
+
+tokens = TokenStore()
+
+
+# -------------------------
+# Dependencies
+# -------------------------
+def current_claims(authorization: Optional[str] = Header(default=None)) -> dict:
+    """
+    Claims of the bearer token on the request; 401 if missing or invalid.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return tokens.verify(token.strip())
+    except InvalidToken as exc:
+        raise HTTPException(status_code=401, detail=str(exc), headers={"WWW-Authenticate": "Bearer"})
+
+
+def current_passenger_id(authorization: Optional[str] = Header(default=None)) -> int:
+    return current_claims(authorization)["sub"]
+
+
+def require_passenger(passenger_id: int, current_id: int):
+    """
+    403 unless the request acts on the logged-in passenger's own data.
+    """
+    if passenger_id is not None and int(passenger_id) != current_id:
+        raise HTTPException(status_code=403, detail="Not allowed for this passenger")
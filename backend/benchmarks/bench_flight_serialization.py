@@ -0,0 +1,76 @@
+# benchmarks/bench_flight_serialization.py
+"""
+Encoding one page of flights: serializers.flights_response (FastJSONResponse)
+against what a response_model endpoint does (validate into FlightOut, dump,
+jsonable_encoder, json.dumps).
+
+    python benchmarks/bench_flight_serialization.py [rows] [iterations]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+import schemas, serializers
+from records import FlightView
+
+
+class StaticRefs:
+    """
+    Stand-in for cache.ReferenceCache, so no database is needed.
+    """
+
+    def airline_name(self, airline_id):
+        return "Air India"
+
+    def airport_city(self, airport_id):
+        return "Delhi" if airport_id == 1 else "Mumbai"
+
+
+def make_page(rows: int):
+    departure = datetime(2025, 11, 5, 18)
+    flights = [
+        FlightView(i, f"AI{i}", departure + timedelta(minutes=i), departure + timedelta(hours=2, minutes=i),
+                   120, 150, 5200.0, 5310.25, departure, 1, 1, 2)
+        for i in range(1, rows + 1)
+    ]
+    prices = [5312.57 + i for i in range(rows)]
+    return flights, prices
+
+
+def response_model_path(flights, prices, refs, adapter) -> bytes:
+    content = [serializers.flight_out(f, p, refs) for f, p in zip(flights, prices)]
+    validated = adapter.validate_python(content)
+    return json.dumps(
+        jsonable_encoder(adapter.dump_python(validated, mode="json")), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def fast_path(flights, prices, refs) -> bytes:
+    return serializers.flights_response(flights, prices, refs).body
+
+
+def main(rows: int = 50, iterations: int = 2000):
+    flights, prices = make_page(rows)
+    refs = StaticRefs()
+    adapter = TypeAdapter(list[schemas.FlightOut])
+    assert json.loads(response_model_path(flights, prices, refs, adapter)) == json.loads(fast_path(flights, prices, refs))
+
+    print(f"{rows}-row page, best of 3 x {iterations} ({'orjson' if serializers.orjson else 'json'} encoder)")
+    results = {}
+    for name, fn in (
+        ("response_model", lambda: response_model_path(flights, prices, refs, adapter)),
+        ("FastJSONResponse", lambda: fast_path(flights, prices, refs)),
+    ):
+        results[name] = min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations
+        print(f"  {name:<17} {results[name] * 1e6:8.1f} us")
+    print(f"  speedup           {results['response_model'] / results['FastJSONResponse']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
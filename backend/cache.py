@@ -0,0 +1,262 @@
+# cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from database import SessionLocal
+import models
+
+# -------------------------
+# Configuration
+# -------------------------
+# airports/airlines are reloaded at most this often even without explicit invalidation
+REFERENCE_CACHE_TTL_SECONDS = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "10000"))
+# upper bound on staleness for changes this worker doesn't see (other workers'
+# bookings, market ticks run by the leader worker)
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30"))
+SEAT_MAP_CACHE_MAX_ENTRIES = int(os.getenv("SEAT_MAP_CACHE_MAX_ENTRIES", "5000"))
+
+
+# -------------------------
+# Airport / airline reference cache
+# -------------------------
+class ReferenceCache:
+    """
+    Warm, versioned in-memory copy of the airports and airlines tables.
+    Flight queries select plain ids and decorate rows from here instead of
+    joining three reference tables on every read.
+    """
+
+    def __init__(self, ttl_seconds: int = REFERENCE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._expires_at = 0.0
+        self.version = 0
+        self.etag = None
+        self.airports = {}  # airport_id -> dict
+        self.airlines = {}  # airline_id -> dict
+        self.airport_list = []  # /airports payload, sorted by city
+        self._airport_index = {}  # lowercased city / IATA code -> [airport_id]
+
+    def load(self):
+        """
+        (Re)load both tables and bump the version.
+        """
+        db = SessionLocal()
+        try:
+            airports = db.query(models.Airport).all()
+            airlines = db.query(models.Airline).all()
+        finally:
+            db.close()
+
+        airport_map = {
+            a.airport_id: {
+                "airport_id": a.airport_id,
+                "airport_name": a.airport_name,
+                "iata_code": a.iata_code,
+                "city": a.city,
+                "country": a.country,
+            }
+            for a in airports
+        }
+        airline_map = {
+            a.airline_id: {"airline_id": a.airline_id, "airline_name": a.airline_name, "iata_code": a.iata_code}
+            for a in airlines
+        }
+        index = {}
+        for a in airport_map.values():
+            for key in {(a["city"] or "").lower(), (a["iata_code"] or "").lower()} - {""}:
+                index.setdefault(key, []).append(a["airport_id"])
+
+        airport_list = [
+            {"airport_id": a["airport_id"], "city": a["city"], "country": a["country"]}
+            for a in sorted(airport_map.values(), key=lambda a: (a["city"] is not None, a["city"] or ""))
+        ]
+        digest = hashlib.sha1(
+            json.dumps([airport_list, sorted(airline_map.items())], default=str).encode()
+        ).hexdigest()[:16]
+
+        with self._lock:
+            self.airports = airport_map
+            self.airlines = airline_map
+            self.airport_list = airport_list
+            self._airport_index = index
+            self.version += 1
+            self.etag = f'"ref-{digest}"'
+            self._expires_at = time.monotonic() + self.ttl_seconds
+
+    def invalidate(self):
+        """
+        Force a reload on next access (call after editing airports or airlines).
+        """
+        with self._lock:
+            self._expires_at = 0.0
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    def ensure_fresh(self):
+        if self.expired():
+            self.load()
+        return self
+
+    # --- lookups ---
+    def airport_city(self, airport_id):
+        a = self.ensure_fresh().airports.get(airport_id)
+        return a["city"] if a else None
+
+    def airline_name(self, airline_id):
+        a = self.ensure_fresh().airlines.get(airline_id)
+        return a["airline_name"] if a else None
+
+    def airport_ids(self, term: str) -> list:
+        """
+        Airport ids whose city or IATA code matches `term` (case-insensitive).
+        """
+        return list(self.ensure_fresh()._airport_index.get(term.strip().lower(), []))
+
+
+reference_cache = ReferenceCache()
+
+
+# -------------------------
+# Search result cache
+# -------------------------
+class SearchCache:
+    """
+    LRU + TTL cache of search result pages keyed by the normalized query.
+    Each entry remembers which flights it contains, so a booking, cancellation
+    or market price update evicts only the pages that show those flights.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl_seconds: int = SEARCH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value, flight_ids)
+        self._by_flight = {}  # flight_id -> set of keys
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(**params) -> tuple:
+        """
+        Normalize query params so equivalent searches share an entry.
+        """
+        return tuple(
+            (name, value.strip().lower() if isinstance(value, str) else value)
+            for name, value in sorted(params.items())
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, value, flight_ids):
+        flight_ids = frozenset(flight_ids)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, flight_ids)
+            for flight_id in flight_ids:
+                self._by_flight.setdefault(flight_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate_flights(self, flight_ids):
+        """
+        Drop every cached page that contains any of these flights.
+        """
+        with self._lock:
+            for flight_id in flight_ids:
+                for key in self._by_flight.pop(flight_id, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_flight.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                hit_ratio=round(self.stats["hits"] / lookups, 4) if lookups else None,
+            )
+
+    def _remove(self, key):
+        _, _, flight_ids = self._entries.pop(key)
+        for flight_id in flight_ids:
+            keys = self._by_flight.get(flight_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_flight[flight_id]
+
+
+search_cache = SearchCache()
+
+
+
+# -------------------------
+# Seat map cache
+# -------------------------
+class SeatMapCache:
+    """
+    Latest encoded seat map per flight, tagged with the flight's seat_map_version.
+    A version bump (any claim or release, from any worker) makes the entry miss,
+    so no explicit invalidation is needed.
+    """
+
+    def __init__(self, max_entries: int = SEAT_MAP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # flight_id -> (version, payload)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, flight_id: int, version: int):
+        with self._lock:
+            entry = self._entries.get(flight_id)
+            if entry is None or entry[0] != version:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(flight_id)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, flight_id: int, version: int, payload):
+        with self._lock:
+            current = self._entries.get(flight_id)
+            if current is not None and current[0] > version:
+                return  # a newer map is already cached
+            self._entries[flight_id] = (version, payload)
+            self._entries.move_to_end(flight_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+
+seat_map_cache = SeatMapCache()
@@ -1,7 +1,13 @@
 from dotenv import load_dotenv
+import bisect
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 
 # Load environment variables from .env
 load_dotenv()
@@ -13,9 +19,179 @@ DB_NAME = os.getenv("DB_NAME", "flight_simulator")
 DB_PORT = os.getenv("DB_PORT", "3306")  # optional, default MySQL port
 
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# same database through an asyncio driver, for the async endpoints
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# -------------------------
+# Pool configuration (applies to the sync and the async engine separately)
+# -------------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# reconnect before MySQL's wait_timeout drops idle connections server-side
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+# -------------------------
+# Pool instrumentation
+# -------------------------
+class LatencyHistogram:
+    """
+    Thread-safe bucketed latency counts; bucket keys are upper bounds in ms.
+    """
+
+    BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(self.BOUNDS_MS, seconds * 1000)
+        with self._lock:
+            self.buckets[i] += 1
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{b}ms" for b in self.BOUNDS_MS] + ["inf"]
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else None,
+                "max_ms": round(self.max_seconds * 1000, 3),
+                "buckets": dict(zip(labels, self.buckets)),
+            }
+
+
+# per-request connection usage, set by the HTTP middleware in main.py
+_request_usage: ContextVar = ContextVar("db_request_usage", default=None)
+
+# total connection hold time per request (requests that never touched the DB are skipped)
+request_hold = LatencyHistogram()
+
+
+def begin_request_usage():
+    """
+    Start accumulating connection usage for the current request.
+    Returns (usage dict, token for end_request_usage).
+    """
+    usage = {"checkouts": 0, "hold_seconds": 0.0}
+    return usage, _request_usage.set(usage)
+
+
+def end_request_usage(token) -> dict:
+    usage = _request_usage.get()
+    _request_usage.reset(token)
+    if usage and usage["checkouts"]:
+        request_hold.observe(usage["hold_seconds"])
+    return usage
+
+
+class _InstrumentedPool:
+    """
+    QueuePool mixin recording checkout wait, connect latency, hold time and timeouts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait = LatencyHistogram()  # time to get a connection (includes connect when growing)
+        self.connect_latency = LatencyHistogram()
+        self.hold = LatencyHistogram()
+        self.timeouts = 0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1  # pool exhausted for DB_POOL_TIMEOUT seconds
+            raise
+        finally:
+            self.wait.observe(time.perf_counter() - started)
+
+    def _do_get(self):
+        record = super()._do_get()
+        record.info["checked_out_at"] = time.perf_counter()
+        return record
+
+    def _do_return_conn(self, record):
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            held = time.perf_counter() - checked_out_at
+            self.hold.observe(held)
+            usage = _request_usage.get()
+            if usage is not None:
+                usage["checkouts"] += 1
+                usage["hold_seconds"] += held
+        super()._do_return_conn(record)
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            self.connect_latency.observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(bind) -> dict:
+    """
+    Live counters for an engine's pool (plus histograms when instrumented).
+    """
+    pool = bind.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    status = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "timeout_seconds": pool.timeout(),
+    }
+    if isinstance(pool, _InstrumentedPool):
+        status.update(
+            timeouts=pool.timeouts,
+            wait=pool.wait.snapshot(),
+            connect=pool.connect_latency.snapshot(),
+            hold=pool.hold.snapshot(),
+        )
+    return status
+
+
+def _pool_options(poolclass) -> dict:
+    return dict(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+engine = create_engine(DATABASE_URL, **_pool_options(InstrumentedQueuePool))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(InstrumentedAsyncQueuePool))
+
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) reload
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
@@ -0,0 +1,356 @@
+# fare_history.py
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, and_, or_
+from database import engine
+import models
+
+# -------------------------
+# Configuration
+# -------------------------
+# buffered fare points are written once this many are queued (and on every market tick)
+FARE_HISTORY_BATCH_SIZE = int(os.getenv("FARE_HISTORY_BATCH_SIZE", "1000"))
+# raw points older than this are rolled up into hourly buckets
+FARE_HISTORY_RAW_RETENTION_DAYS = int(os.getenv("FARE_HISTORY_RAW_RETENTION_DAYS", "7"))
+# hourly buckets older than this are rolled up into daily buckets
+FARE_HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv("FARE_HISTORY_HOURLY_RETENTION_DAYS", "90"))
+FARE_ROLLUP_INTERVAL_SECONDS = int(os.getenv("FARE_ROLLUP_INTERVAL_SECONDS", "3600"))
+
+fare_history_t = models.FareHistory.__table__
+rollup_t = models.FareHistoryRollup.__table__
+
+
+# -------------------------
+# Buffered writer
+# -------------------------
+class FareHistoryWriter:
+    """
+    Collects fare points in memory and writes them as multi-row INSERTs.
+    A point whose price equals the previous point for the same flight is dropped,
+    so flat stretches of history cost nothing.
+    """
+
+    def __init__(self, batch_size: int = FARE_HISTORY_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._last_price = {}  # flight_id -> last recorded price
+        self.stats = {"recorded": 0, "dropped_unchanged": 0, "written": 0, "flushes": 0, "errors": 0}
+
+    def record(self, flight_id: int, price, recorded_at: datetime = None):
+        self.record_many([flight_id], [price], recorded_at)
+
+    def record_many(self, flight_ids, prices, recorded_at: datetime = None):
+        recorded_at = recorded_at or datetime.utcnow()
+        with self._lock:
+            for flight_id, price in zip(flight_ids, prices):
+                price = round(float(price), 2)
+                if self._last_price.get(flight_id) == price:
+                    self.stats["dropped_unchanged"] += 1
+                    continue
+                self._last_price[flight_id] = price
+                self._buffer.append({"flight_id": flight_id, "price": price, "recorded_at": recorded_at})
+                self.stats["recorded"] += 1
+            full = len(self._buffer) >= self.batch_size
+
+        if full:
+            self.flush()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, buffered=len(self._buffer))
+
+    def flush(self) -> int:
+        """
+        Write everything buffered so far; returns the number of rows inserted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with engine.begin() as conn:
+                    for i in range(0, len(rows), self.batch_size):
+                        conn.execute(insert(fare_history_t), rows[i:i + self.batch_size])
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    # forget the dropped points so the next price for these flights is recorded
+                    for r in rows:
+                        if self._last_price.get(r["flight_id"]) == r["price"]:
+                            del self._last_price[r["flight_id"]]
+                print("Fare history flush error:", e)
+                return 0
+
+            with self._lock:
+                self.stats["written"] += len(rows)
+                self.stats["flushes"] += 1
+            return len(rows)
+
+
+writer = FareHistoryWriter()
+
+
+# -------------------------
+# Retention / downsampling
+# -------------------------
+def _bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "DAY":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class _BucketAggregate:
+    __slots__ = ("flight_id", "bucket_start", "open", "close", "low", "high", "total", "samples")
+
+    def __init__(self, flight_id, bucket_start, price, samples=1, total=None, low=None, high=None, close=None):
+        self.flight_id = flight_id
+        self.bucket_start = bucket_start
+        self.open = price
+        self.close = close if close is not None else price
+        self.low = low if low is not None else price
+        self.high = high if high is not None else price
+        self.total = total if total is not None else price * samples
+        self.samples = samples
+
+    def add(self, price, samples=1, total=None, low=None, high=None, close=None):
+        self.close = close if close is not None else price
+        self.low = min(self.low, low if low is not None else price)
+        self.high = max(self.high, high if high is not None else price)
+        self.total += total if total is not None else price * samples
+        self.samples += samples
+
+    def merge(self, other: "_BucketAggregate"):
+        self.add(other.open, samples=other.samples, total=other.total, low=other.low, high=other.high, close=other.close)
+
+    def row(self, granularity: str) -> dict:
+        return {
+            "flight_id": self.flight_id,
+            "granularity": granularity,
+            "bucket_start": self.bucket_start,
+            "open_price": self.open,
+            "close_price": self.close,
+            "min_price": self.low,
+            "max_price": self.high,
+            "avg_price": round(self.total / self.samples, 2),
+            "samples": self.samples,
+        }
+
+
+def _write_buckets(conn, aggregates, granularity: str, batch_size: int) -> int:
+    count = 0
+    batch = []
+    for agg in aggregates:
+        batch.append(agg.row(granularity))
+        if len(batch) >= batch_size:
+            conn.execute(insert(rollup_t), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(rollup_t), batch)
+        count += len(batch)
+    return count
+
+
+def _raw_buckets(rows):
+    """
+    Group raw points (ordered by flight_id, recorded_at) into hourly aggregates.
+    """
+    current = None
+    for r in rows:
+        start = _bucket_start(r.recorded_at, "HOUR")
+        price = float(r.price)
+        if current is not None and current.flight_id == r.flight_id and current.bucket_start == start:
+            current.add(price)
+            continue
+        if current is not None:
+            yield current
+        current = _BucketAggregate(r.flight_id, start, price)
+    if current is not None:
+        yield current
+
+
+def _hourly_buckets(rows):
+    """
+    Group hourly rollups (ordered by flight_id, bucket_start) into daily aggregates.
+    """
+    current = None
+    for r in rows:
+        start = _bucket_start(r.bucket_start, "DAY")
+        fields = dict(
+            samples=r.samples, total=float(r.avg_price) * r.samples,
+            low=float(r.min_price), high=float(r.max_price), close=float(r.close_price),
+        )
+        if current is not None and current.flight_id == r.flight_id and current.bucket_start == start:
+            current.add(float(r.open_price), **fields)
+            continue
+        if current is not None:
+            yield current
+        current = _BucketAggregate(r.flight_id, start, float(r.open_price), **fields)
+    if current is not None:
+        yield current
+
+
+def rollup_fare_history(now: datetime = None, batch_size: int = FARE_HISTORY_BATCH_SIZE) -> dict:
+    """
+    Downsample old fare history: raw points past retention become hourly
+    open/close/min/max/avg buckets, and old hourly buckets become daily ones.
+    Cutoffs are aligned to bucket boundaries so each bucket is rolled exactly once.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = _bucket_start(now - timedelta(days=FARE_HISTORY_RAW_RETENTION_DAYS), "HOUR")
+    hourly_cutoff = _bucket_start(now - timedelta(days=FARE_HISTORY_HOURLY_RETENTION_DAYS), "DAY")
+
+    # rows are streamed on one connection while buckets are written on another
+    with engine.connect() as reader, engine.begin() as conn:
+        rows = reader.execution_options(stream_results=True, yield_per=batch_size).execute(
+            select(fare_history_t.c.flight_id, fare_history_t.c.recorded_at, fare_history_t.c.price)
+            .where(fare_history_t.c.recorded_at < raw_cutoff)
+            .order_by(fare_history_t.c.flight_id, fare_history_t.c.recorded_at)
+        )
+        hourly = _write_buckets(conn, _raw_buckets(rows), "HOUR", batch_size)
+        conn.execute(delete(fare_history_t).where(fare_history_t.c.recorded_at < raw_cutoff))
+
+    with engine.connect() as reader, engine.begin() as conn:
+        rows = reader.execution_options(stream_results=True, yield_per=batch_size).execute(
+            select(rollup_t)
+            .where(rollup_t.c.granularity == "HOUR")
+            .where(rollup_t.c.bucket_start < hourly_cutoff)
+            .order_by(rollup_t.c.flight_id, rollup_t.c.bucket_start)
+        )
+        daily = _write_buckets(conn, _hourly_buckets(rows), "DAY", batch_size)
+        conn.execute(
+            delete(rollup_t).where(rollup_t.c.granularity == "HOUR").where(rollup_t.c.bucket_start < hourly_cutoff)
+        )
+
+    return {"hourly_buckets": hourly, "daily_buckets": daily}
+
+
+# -------------------------
+# Querying
+# -------------------------
+FARE_BUCKETS = {"hour": "HOUR", "day": "DAY"}
+
+
+def _rolled_buckets(rows, granularity: str):
+    for r in rows:
+        yield r.granularity, _BucketAggregate(
+            r.flight_id, _bucket_start(r.bucket_start, granularity), float(r.open_price),
+            samples=r.samples, total=float(r.avg_price) * r.samples,
+            low=float(r.min_price), high=float(r.max_price), close=float(r.close_price),
+        )
+
+
+def _flight_buckets(db, flight_id: int, start: datetime, end: datetime, granularity: str, limit: int):
+    """
+    Up to `limit` (granularity label, aggregate) pairs for one flight in [start, end),
+    oldest first. Rolled-up buckets always precede raw points, since rollups only
+    cover data older than the raw retention window.
+    """
+    # rollup rows are read in keyset chunks until limit + 1 merged buckets exist (the
+    # extra one proves the limit-th is complete); a row limit alone would cut a day of
+    # hourly rollups short and hide the days after it
+    chunk = (limit + 1) * (24 if granularity == "DAY" else 1)
+    out = []
+    last = None
+    while len(out) <= limit:
+        q = (
+            select(rollup_t)
+            .where(rollup_t.c.flight_id == flight_id)
+            .where(rollup_t.c.bucket_start >= _bucket_start(start, granularity))
+            .where(rollup_t.c.bucket_start < end)
+            .order_by(rollup_t.c.bucket_start, rollup_t.c.id)
+            .limit(chunk)
+        )
+        if last is not None:
+            q = q.where(or_(
+                rollup_t.c.bucket_start > last.bucket_start,
+                and_(rollup_t.c.bucket_start == last.bucket_start, rollup_t.c.id > last.id),
+            ))
+        rolled = db.execute(q).all()
+        for label, agg in _rolled_buckets(rolled, granularity):
+            # an hourly request keeps daily rollups at their own (coarser) granularity
+            label = label if granularity == "HOUR" else "DAY"
+            if out and out[-1][1].bucket_start == agg.bucket_start:
+                out[-1][1].merge(agg)
+            else:
+                out.append((label, agg))
+        if len(rolled) < chunk:
+            break
+        last = rolled[-1]
+
+    if len(out) > limit:
+        return out[:limit]
+
+    # raw points: served from ix_fare_history_flight_recorded, streamed until the page is full
+    raw_start = max(start, out[-1][1].bucket_start) if out else start
+    raw = db.execute(
+        select(fare_history_t.c.flight_id, fare_history_t.c.recorded_at, fare_history_t.c.price)
+        .where(fare_history_t.c.flight_id == flight_id)
+        .where(fare_history_t.c.recorded_at >= raw_start)
+        .where(fare_history_t.c.recorded_at < end)
+        .order_by(fare_history_t.c.recorded_at)
+        .execution_options(yield_per=FARE_HISTORY_BATCH_SIZE)
+    )
+    try:
+        for r in raw:
+            ts = _bucket_start(r.recorded_at, granularity)
+            price = float(r.price)
+            if out and out[-1][1].bucket_start == ts:
+                out[-1][1].add(price)
+                continue
+            if len(out) >= limit:
+                break
+            out.append((granularity, _BucketAggregate(flight_id, ts, price)))
+    finally:
+        raw.close()
+    return out
+
+
+def query_fare_buckets(db, flight_ids, start: datetime, end: datetime, bucket: str = "hour",
+                       after=None, limit: int = 500):
+    """
+    OHLC-style fare buckets for the given flights in [start, end), ordered by
+    (flight_id, bucket_start). `after` is the (flight_id, bucket_start) of the last
+    bucket on the previous page. Returns (items, next cursor key or None).
+    """
+    granularity = FARE_BUCKETS[bucket]
+    items = []
+    for flight_id in sorted(set(flight_ids)):
+        lower = start
+        if after is not None:
+            if flight_id < after[0]:
+                continue
+            if flight_id == after[0]:
+                lower = max(start, after[1])
+
+        # one extra: the bucket the cursor points at is fetched again and skipped
+        wanted = limit - len(items) + 1 + (1 if after is not None and flight_id == after[0] else 0)
+        for label, agg in _flight_buckets(db, flight_id, lower, end, granularity, wanted):
+            if after is not None and flight_id == after[0] and agg.bucket_start <= after[1]:
+                continue
+            row = agg.row(label)
+            items.append({
+                "flight_id": flight_id,
+                "bucket_start": row["bucket_start"],
+                "granularity": label,
+                "open": row["open_price"],
+                "high": row["max_price"],
+                "low": row["min_price"],
+                "close": row["close_price"],
+                "avg": row["avg_price"],
+                "samples": row["samples"],
+            })
+            if len(items) > limit:
+                break
+        if len(items) > limit:
+            break
+
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        return items, (last["flight_id"], last["bucket_start"])
+    return items, None
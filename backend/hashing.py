@@ -0,0 +1,101 @@
+# hashing.py
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import utils
+
+# -------------------------
+# Configuration
+# -------------------------
+# worker processes doing bcrypt; each keeps one core busy while hashing
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# hash/verify jobs running or queued at once; beyond this requests get a 429
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 8)))
+# seconds clients are told to wait before retrying a rejected request
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", "1"))
+
+
+class HashingBusy(Exception):
+    """
+    The hashing queue is full; the caller should answer 429 and let the client retry.
+    """
+
+
+class HashingPool:
+    """
+    bcrypt on a process pool, so hashing neither holds a request thread nor the
+    API process's GIL. Admission is bounded: a job either gets one of
+    HASH_QUEUE_LIMIT slots immediately or is rejected with HashingBusy.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.metrics = {"submitted": 0, "rejected": 0, "rehashed": 0, "in_flight": 0}
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the API process has DB connections and background threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._executor
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(
+                self.metrics,
+                workers=self.workers,
+                queue_limit=self.queue_limit,
+                rounds=utils.BCRYPT_ROUNDS,
+            )
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.metrics["rejected"] += 1
+            raise HashingBusy()
+        try:
+            future = (self._executor or self.start()).submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.metrics["submitted"] += 1
+            self.metrics["in_flight"] += 1
+        future.add_done_callback(self._done)
+        return asyncio.wrap_future(future)
+
+    def _done(self, future):
+        with self._lock:
+            self.metrics["in_flight"] -= 1
+        self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(utils.hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple:
+        """
+        Returns (valid, new hash or None); the new hash is set when the stored one
+        was made with an outdated cost factor and should replace it.
+        """
+        valid, new_hash = await self._submit(utils.verify_and_update_password, password, hashed_password)
+        if new_hash:
+            with self._lock:
+                self.metrics["rehashed"] += 1
+        return valid, new_hash
+
+
+pool = HashingPool()
@@ -0,0 +1,192 @@
+# holds.py
+import heapq
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from database import SessionLocal
+import models, inventory, cache
+
+# -------------------------
+# Configuration
+# -------------------------
+# how long a PENDING_PAYMENT booking keeps its seats
+SEAT_HOLD_TTL_SECONDS = int(os.getenv("SEAT_HOLD_TTL_SECONDS", "900"))
+HOLD_REAP_INTERVAL_SECONDS = float(os.getenv("HOLD_REAP_INTERVAL_SECONDS", "5"))
+# full scan of the bookings table, picking up holds placed by other workers
+HOLD_SWEEP_INTERVAL_SECONDS = int(os.getenv("HOLD_SWEEP_INTERVAL_SECONDS", "60"))
+HOLD_REAP_BATCH = int(os.getenv("HOLD_REAP_BATCH", "500"))
+
+# bookings in these states no longer hold seats
+RELEASED_STATUSES = ("CANCELLED", "EXPIRED", "PAYMENT_FAILED")
+
+bookings_t = models.Booking.__table__
+
+
+def hold_deadline(now: datetime = None) -> datetime:
+    return (now or datetime.utcnow()) + timedelta(seconds=SEAT_HOLD_TTL_SECONDS)
+
+
+def release_holds(db, pnrs, now: datetime = None, status: str = "EXPIRED", expired_only: bool = True) -> Counter:
+    """
+    Move the PENDING_PAYMENT bookings of `pnrs` to `status` and put their seats back
+    (seat rows freed and available_seats restored, one UPDATE per flight at most).
+    Rows another transaction is paying right now are skipped, not waited on.
+    Returns {flight_id: seats released}; the caller commits.
+    """
+    now = now or datetime.utcnow()
+    q = (
+        select(bookings_t.c.booking_id, bookings_t.c.flight_id, bookings_t.c.pnr)
+        .where(bookings_t.c.pnr.in_(list(pnrs)))
+        .where(bookings_t.c.status == "PENDING_PAYMENT")
+    )
+    if expired_only:
+        q = q.where(bookings_t.c.hold_expires_at <= now)
+    rows = db.execute(q.with_for_update(skip_locked=True)).all()
+    if not rows:
+        return Counter()
+
+    db.execute(
+        update(bookings_t)
+        .where(bookings_t.c.booking_id.in_([r.booking_id for r in rows]))
+        .values(status=status, hold_expires_at=None)
+    )
+    counts = Counter(r.flight_id for r in rows)
+    by_flight = defaultdict(set)
+    for r in rows:
+        by_flight[r.flight_id].add(r.pnr)
+    for flight_id, flight_pnrs in by_flight.items():
+        inventory.release_pnrs(db, flight_id, flight_pnrs)
+    inventory.return_seats(db, counts)
+    return counts
+
+
+# -------------------------
+# Background reaper
+# -------------------------
+class HoldReaper:
+    """
+    Min-heap of (expires_at, pnr) for holds, drained on a background thread that
+    releases everything due in bulk. Holds placed by this worker are pushed as they
+    are created; a periodic sweep of the bookings table picks up the rest.
+    Releases are conditional on status, so every worker can run one.
+    """
+
+    def __init__(self, interval_seconds: float = HOLD_REAP_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._heap = []
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_sweep = 0.0
+        self.metrics = {
+            "reaps": 0,
+            "released_bookings": 0,  # one seat each
+            "errors": 0,
+            "last_sweep_at": None,
+        }
+
+    def add(self, pnr: str, expires_at: datetime):
+        with self._lock:
+            if pnr not in self._queued:
+                self._queued.add(pnr)
+                heapq.heappush(self._heap, (expires_at, pnr))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hold-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(
+                self.metrics,
+                queued=len(self._heap),
+                next_expiry=self._heap[0][0] if self._heap else None,
+                ttl_seconds=SEAT_HOLD_TTL_SECONDS,
+            )
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                if time.monotonic() >= self._next_sweep:
+                    self._next_sweep = time.monotonic() + HOLD_SWEEP_INTERVAL_SECONDS
+                    self.sweep()
+                self.reap()
+            except Exception as e:
+                with self._lock:
+                    self.metrics["errors"] += 1
+                print("Hold reaper error:", e)
+
+    def _pop_due(self, now: datetime) -> list:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < HOLD_REAP_BATCH:
+                _, pnr = heapq.heappop(self._heap)
+                self._queued.discard(pnr)
+                due.append(pnr)
+        return due
+
+    def reap(self, now: datetime = None) -> int:
+        """
+        Release every hold that is due; returns the number of bookings released.
+        """
+        now = now or datetime.utcnow()
+        released = 0
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                return released
+            db = SessionLocal()
+            try:
+                counts = release_holds(db, due, now)
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._lock:  # try again next round
+                    for pnr in due:
+                        if pnr not in self._queued:
+                            self._queued.add(pnr)
+                            heapq.heappush(self._heap, (now, pnr))
+                raise
+            finally:
+                db.close()
+            if counts:
+                cache.search_cache.invalidate_flights(counts)
+            released += sum(counts.values())
+            with self._lock:
+                self.metrics["reaps"] += 1
+                self.metrics["released_bookings"] += sum(counts.values())
+
+    def sweep(self):
+        """
+        Queue every outstanding hold in the database (one row per PNR).
+        """
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(bookings_t.c.pnr, func.min(bookings_t.c.hold_expires_at))
+                .where(bookings_t.c.status == "PENDING_PAYMENT")
+                .where(bookings_t.c.hold_expires_at.isnot(None))
+                .group_by(bookings_t.c.pnr)
+            ).all()
+        finally:
+            db.close()
+        for pnr, expires_at in rows:
+            self.add(pnr, expires_at)
+        with self._lock:
+            self.metrics["last_sweep_at"] = time.time()
+
+
+reaper = HoldReaper()
@@ -0,0 +1,442 @@
+# inventory.py
+import base64
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, update, insert, case, func, tuple_
+from sqlalchemy.exc import IntegrityError
+import models, pricing
+
+# -------------------------
+# Configuration
+# -------------------------
+# cabin layout: seats are numbered row by row ("1A".."1F", "2A", ...)
+SEAT_COLUMNS = os.getenv("SEAT_COLUMNS", "ABCDEF")
+# aisle after this many columns (A B | C D E F), as drawn by SeatSelection.jsx
+SEAT_AISLES = (2,)
+CABIN_ROWS = {"BUSINESS": (1, 2), "LEGROOM": (10,)}
+# rounds of "pick free seats, try to claim them" before an auto-assign gives up
+SEAT_CLAIM_ATTEMPTS = int(os.getenv("SEAT_CLAIM_ATTEMPTS", "5"))
+# read-price-take rounds before a booking stops insisting on an unchanged flight row
+SEAT_RESERVE_ATTEMPTS = int(os.getenv("SEAT_RESERVE_ATTEMPTS", "3"))
+# holder of seats sold outside this system: by the market simulator, or before a
+# flight's seat rows existed
+MARKET_PNR = "MARKET"
+
+seats_t = models.FlightSeat.__table__
+flights_t = models.Flight.__table__
+
+
+class SeatUnavailable(Exception):
+    """
+    Requested seats are taken, unknown, or the flight has too few seats left.
+    """
+
+
+class FlightChanged(Exception):
+    """
+    The flight row's version moved since it was read (optimistic check failed).
+    """
+
+
+# -------------------------
+# Layout
+# -------------------------
+def seat_label(index: int) -> str:
+    row, col = divmod(index, len(SEAT_COLUMNS))
+    return f"{row + 1}{SEAT_COLUMNS[col]}"
+
+
+def seat_labels(total_seats: int) -> list:
+    return [seat_label(i) for i in range(total_seats or 0)]
+
+
+def layout_rows(total_seats: int) -> int:
+    return -(-(total_seats or 0) // len(SEAT_COLUMNS))
+
+
+def seat_layout(total_seats: int) -> dict:
+    return {
+        "rows": layout_rows(total_seats),
+        "columns": SEAT_COLUMNS,
+        "aisles": list(SEAT_AISLES),
+        "cabins": {name: list(rows) for name, rows in CABIN_ROWS.items()},
+    }
+
+
+def presold_indexes(flight_id: int, total_seats: int, count: int, exclude=()) -> list:
+    """
+    Seat indexes counted as sold on a flight whose seat rows don't exist yet: the first
+    `count` of a fixed per-flight shuffle, skipping `exclude`. The seat map endpoints
+    report these and ensure_seat_rows creates them as taken, so both agree.
+    """
+    order = list(range(total_seats or 0))
+    random.Random(flight_id).shuffle(order)
+    exclude = set(exclude)
+    return sorted([i for i in order if i not in exclude][:max(0, count)])
+
+
+def ensure_seat_rows(db, flight_id: int, total_seats: int, held: int = 0, requested=()):
+    """
+    Create a flight's seat rows on first use (inside the caller's transaction).
+    Seats already gone from available_seats, other than the `held` ones this
+    transaction has just taken, are created as held by MARKET_PNR (see presold_indexes);
+    the `requested` seat labels are never among them.
+    """
+    exists = db.execute(select(seats_t.c.seat_no).where(seats_t.c.flight_id == flight_id).limit(1)).first()
+    if exists:
+        return
+    # the caller's seat decrement keeps the flight row locked, so this count can't move under us
+    available = db.execute(
+        select(flights_t.c.available_seats).where(flights_t.c.flight_id == flight_id)
+    ).scalar_one()
+    labels = seat_labels(total_seats)
+    index_of = {label: i for i, label in enumerate(labels)}
+    sold = set(presold_indexes(
+        flight_id, total_seats, total_seats - available - held, exclude=[index_of[s] for s in requested if s in index_of]
+    ))
+    now = datetime.utcnow()
+    # stamped with a version of their own, so a ?since= delta from the version-0 map includes them
+    version = _next_seat_version(db, flight_id)
+    rows = [
+        {
+            "flight_id": flight_id,
+            "seat_no": label,
+            "seat_index": i,
+            "pnr": MARKET_PNR if i in sold else None,
+            "claimed_at": now if i in sold else None,
+            "version": version,
+        }
+        for i, label in enumerate(labels)
+    ]
+    try:
+        with db.begin_nested():
+            db.execute(insert(seats_t), rows)
+    except IntegrityError:
+        pass  # a concurrent booking created them first
+
+
+# -------------------------
+# Seat counter
+# -------------------------
+def take_seats(db, flight_id: int, count: int, version: int = None):
+    """
+    Take `count` seats off available_seats with one conditional UPDATE
+    (no SELECT ... FOR UPDATE on the flight row). With `version`, the update also
+    requires the row to be unchanged since it was read and raises FlightChanged if not.
+    """
+    q = (
+        update(flights_t)
+        .where(flights_t.c.flight_id == flight_id)
+        .where(flights_t.c.available_seats >= count)
+        .values(available_seats=flights_t.c.available_seats - count, version=flights_t.c.version + 1)
+    )
+    if version is not None:
+        q = q.where(flights_t.c.version == version)
+    if db.execute(q).rowcount != 1:
+        # can't tell "sold out" from "moved" without another read; a re-read settles it
+        raise FlightChanged() if version is not None else SeatUnavailable("Not enough seats available")
+
+
+def reserve_seats(db, flight_ids: list, count: int, ctx: pricing.PricingContext = None):
+    """
+    Read and price the flights like every read path does (pricing.snapshot_prices), then
+    take `count` seats on each with version-checked conditional UPDATEs. Nothing is locked while reading and pricing; if a flight moved
+    in between, the transaction is rolled back and the flights re-read and re-priced.
+    The last attempt takes the seats at the latest quote without the version check,
+    so a hot flight never fails a booking that still has seats.
+    Returns [(flight row, price)] in flight_ids order, or None if a flight doesn't exist.
+    """
+    for attempt in range(SEAT_RESERVE_ATTEMPTS):
+        rows = db.execute(
+            select(
+                flights_t.c.flight_id,
+                flights_t.c.airline_id,
+                flights_t.c.base_fare,
+                flights_t.c.available_seats,
+                flights_t.c.total_seats,
+                flights_t.c.departure_time,
+                flights_t.c.current_price,
+                flights_t.c.price_updated_at,
+                flights_t.c.version,
+            ).where(flights_t.c.flight_id.in_(flight_ids))
+        ).all()
+        by_id = {r.flight_id: r for r in rows}
+        if any(fid not in by_id for fid in flight_ids):
+            return None
+        flights = [by_id[fid] for fid in flight_ids]
+        if any(f.available_seats < count for f in flights):
+            raise SeatUnavailable("Not enough seats available")
+
+        # the fare charged is the fare shown: the market snapshot where fresh
+        prices = pricing.snapshot_prices(flights, ctx)
+
+        checked = attempt < SEAT_RESERVE_ATTEMPTS - 1
+        try:
+            for f in flights:
+                take_seats(db, f.flight_id, count, f.version if checked else None)
+            return list(zip(flights, prices))
+        except FlightChanged:
+            db.rollback()  # also gives the re-read a fresh snapshot
+
+
+def return_seats(db, counts: dict):
+    """
+    Put seats back on available_seats for several flights ({flight_id: count})
+    in a single UPDATE, capped at total_seats (negative counts take seats off).
+    """
+    counts = {fid: n for fid, n in counts.items() if n}
+    if not counts:
+        return
+    restored = flights_t.c.available_seats + case(counts, value=flights_t.c.flight_id, else_=0)
+    db.execute(
+        update(flights_t)
+        .where(flights_t.c.flight_id.in_(counts))
+        .values(
+            available_seats=case((restored > flights_t.c.total_seats, flights_t.c.total_seats), else_=restored),
+            version=flights_t.c.version + 1,
+        )
+    )
+
+
+def _next_seat_version(db, flight_id: int) -> int:
+    """
+    Bump the flight's seat_map_version inside the caller's transaction; seats changed
+    by this transaction are stamped with it so clients can ask for deltas.
+    """
+    db.execute(
+        update(flights_t)
+        .where(flights_t.c.flight_id == flight_id)
+        .values(seat_map_version=flights_t.c.seat_map_version + 1)
+    )
+    return db.execute(
+        select(flights_t.c.seat_map_version).where(flights_t.c.flight_id == flight_id)
+    ).scalar_one()
+
+
+# -------------------------
+# Seat assignment
+# -------------------------
+def claim_seats(db, flight_id: int, total_seats: int, pnr: str, requested: list, now: datetime = None) -> list:
+    """
+    Claim one seat per entry of `requested` for `pnr`; None entries get any free seat.
+    Every claim is a conditional UPDATE (`... WHERE pnr IS NULL`), so two bookings can
+    never hold the same seat. Returns the seat labels in request order.
+    """
+    now = now or datetime.utcnow()
+    explicit = [s.strip().upper() for s in requested if s]
+    unknown = set(explicit) - set(seat_labels(total_seats))
+    if unknown:
+        raise SeatUnavailable(f"Unknown seat(s): {', '.join(sorted(unknown))}")
+    if len(set(explicit)) != len(explicit):
+        raise SeatUnavailable("The same seat was requested twice")
+
+    ensure_seat_rows(db, flight_id, total_seats, held=len(requested), requested=explicit)
+    version = _next_seat_version(db, flight_id)
+
+    if explicit:
+        result = db.execute(_claim(flight_id, explicit, pnr, now, version))
+        if result.rowcount != len(explicit):
+            raise SeatUnavailable(f"Seat(s) already taken: {', '.join(explicit)}")
+
+    wanted = len(requested) - len(explicit)
+    assigned = []
+    tried = set(explicit)
+    for _ in range(SEAT_CLAIM_ATTEMPTS):
+        need = wanted - len(assigned)
+        if need <= 0:
+            break
+        q = (
+            select(seats_t.c.seat_no)
+            .where(seats_t.c.flight_id == flight_id)
+            .where(seats_t.c.pnr.is_(None))
+            .order_by(seats_t.c.seat_index)
+            .limit(need * 4)
+        )
+        if tried:
+            q = q.where(seats_t.c.seat_no.notin_(tried))
+        free = db.execute(q).scalars().all()
+        if not free:
+            break
+        # spread concurrent auto-assigns over a window so they don't all race for the same seat
+        candidates = random.sample(free, min(need, len(free)))
+        tried.update(candidates)
+
+        result = db.execute(_claim(flight_id, candidates, pnr, now, version))
+        if result.rowcount == len(candidates):
+            assigned.extend(candidates)
+        else:
+            # lost some races: keep the ones we got and try again for the rest
+            won = set(
+                db.execute(
+                    select(seats_t.c.seat_no)
+                    .where(seats_t.c.flight_id == flight_id)
+                    .where(seats_t.c.seat_no.in_(candidates))
+                    .where(seats_t.c.pnr == pnr)
+                ).scalars()
+            )
+            assigned.extend(s for s in candidates if s in won)
+
+    if len(assigned) < wanted:
+        raise SeatUnavailable("No free seats left to assign")
+
+    auto = iter(assigned)
+    return [s.strip().upper() if s else next(auto) for s in requested]
+
+
+def _claim(flight_id: int, seat_nos: list, pnr: str, now: datetime, version: int):
+    return (
+        update(seats_t)
+        .where(seats_t.c.flight_id == flight_id)
+        .where(seats_t.c.seat_no.in_(seat_nos))
+        .where(seats_t.c.pnr.is_(None))
+        .values(pnr=pnr, claimed_at=now, version=version)
+    )
+
+
+def release_seats(db, flight_id: int, pnr: str, seat_nos: list = None) -> int:
+    """
+    Free the seats `pnr` holds on a flight (all of them, or just `seat_nos`).
+    """
+    q = (
+        update(seats_t)
+        .where(seats_t.c.flight_id == flight_id)
+        .where(seats_t.c.pnr == pnr)
+        .values(pnr=None, claimed_at=None, version=_next_seat_version(db, flight_id))
+    )
+    if seat_nos is not None:
+        q = q.where(seats_t.c.seat_no.in_(seat_nos))
+    return db.execute(q).rowcount
+
+
+# -------------------------
+# Market seats (batched across flights)
+# -------------------------
+def bump_seat_versions(db, flight_ids: list) -> dict:
+    """
+    _next_seat_version for many flights at once: one UPDATE (which also locks the
+    flight rows until commit) and one read. Returns {flight_id: flight row} with
+    available_seats, total_seats and the new seat_map_version.
+    """
+    db.execute(
+        update(flights_t)
+        .where(flights_t.c.flight_id.in_(flight_ids))
+        .values(seat_map_version=flights_t.c.seat_map_version + 1)
+    )
+    rows = db.execute(
+        select(flights_t.c.flight_id, flights_t.c.available_seats, flights_t.c.total_seats, flights_t.c.seat_map_version)
+        .where(flights_t.c.flight_id.in_(flight_ids))
+    ).all()
+    return {r.flight_id: r for r in rows}
+
+
+def _pick_seats(db, counts: dict, holder) -> dict:
+    """
+    {flight_id: seat labels}: the first counts[flight_id] seats held by `holder`
+    (None = free) on each flight, in layout order, in one query.
+    """
+    counts = {fid: n for fid, n in counts.items() if n > 0}
+    if not counts:
+        return {}
+    held = seats_t.c.pnr.is_(None) if holder is None else seats_t.c.pnr == holder
+    position = func.row_number().over(partition_by=seats_t.c.flight_id, order_by=seats_t.c.seat_index)
+    ranked = (
+        select(seats_t.c.flight_id, seats_t.c.seat_no, position.label("position"))
+        .where(seats_t.c.flight_id.in_(list(counts)))
+        .where(held)
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.flight_id, ranked.c.seat_no)
+        .where(ranked.c.position <= case(counts, value=ranked.c.flight_id, else_=0))
+    ).all()
+    picked = defaultdict(list)
+    for r in rows:
+        picked[r.flight_id].append(r.seat_no)
+    return picked
+
+
+def _set_holder(db, picked: dict, holder, versions: dict, now: datetime = None):
+    pairs = [(fid, seat_no) for fid, seat_nos in picked.items() for seat_no in seat_nos]
+    if pairs:
+        db.execute(
+            update(seats_t)
+            .where(tuple_(seats_t.c.flight_id, seats_t.c.seat_no).in_(pairs))
+            .values(pnr=holder, claimed_at=now, version=case(versions, value=seats_t.c.flight_id))
+        )
+
+
+def claim_market_seats(db, counts: dict, versions: dict, now: datetime = None) -> dict:
+    """
+    Give up to counts[flight_id] free seats per flight to MARKET_PNR (simulated sales),
+    stamped with versions[flight_id]. The flight rows must be locked (bump_seat_versions).
+    Returns {flight_id: seats claimed}.
+    """
+    picked = _pick_seats(db, counts, None)
+    _set_holder(db, picked, MARKET_PNR, versions, now or datetime.utcnow())
+    return {fid: len(seat_nos) for fid, seat_nos in picked.items()}
+
+
+def release_market_seats(db, counts: dict, versions: dict) -> dict:
+    """
+    Free up to counts[flight_id] seats held by MARKET_PNR per flight (simulated
+    cancellations); bookings' seats are never touched. Returns {flight_id: seats freed}.
+    """
+    picked = _pick_seats(db, counts, MARKET_PNR)
+    _set_holder(db, picked, None, versions)
+    return {fid: len(seat_nos) for fid, seat_nos in picked.items()}
+
+
+def release_pnrs(db, flight_id: int, pnrs) -> int:
+    """
+    Free every seat held by any of `pnrs` on a flight (one version bump, one UPDATE).
+    """
+    return db.execute(
+        update(seats_t)
+        .where(seats_t.c.flight_id == flight_id)
+        .where(seats_t.c.pnr.in_(list(pnrs)))
+        .values(pnr=None, claimed_at=None, version=_next_seat_version(db, flight_id))
+    ).rowcount
+
+
+def seat_map(db, flight_id: int, total_seats: int, available_seats: int) -> tuple:
+    """
+    (free, taken) seat labels in layout order. Flights nobody has booked yet have
+    no seat rows; their sold seats are the presold_indexes for available_seats.
+    """
+    rows = db.execute(
+        select(seats_t.c.seat_no, seats_t.c.pnr)
+        .where(seats_t.c.flight_id == flight_id)
+        .order_by(seats_t.c.seat_index)
+    ).all()
+    if not rows:
+        labels = seat_labels(total_seats)
+        sold = set(presold_indexes(flight_id, total_seats, total_seats - (available_seats or 0)))
+        return [s for i, s in enumerate(labels) if i not in sold], [labels[i] for i in sorted(sold)]
+    free = [r.seat_no for r in rows if r.pnr is None]
+    taken = [r.seat_no for r in rows if r.pnr is not None]
+    return free, taken
+
+
+# -------------------------
+# Compact seat map
+# -------------------------
+def encode_seat_bitmap(taken_indexes, total_seats: int) -> str:
+    """
+    Base64 bitset of taken seats: bit (i % 8) of byte (i // 8) is seat index i
+    (row-major, see seat_label).
+    """
+    bits = bytearray(-(-(total_seats or 0) // 8))
+    for i in taken_indexes:
+        bits[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bits)).decode("ascii")
+
+
+def seat_map_etag(flight_id: int, version: int, available_seats: int = None) -> str:
+    """
+    Version 0 (no seat rows yet) also carries available_seats, which decides the presold seats.
+    """
+    if version == 0:
+        return f'"seats-{flight_id}-0-{available_seats}"'
+    return f'"seats-{flight_id}-{version}"'
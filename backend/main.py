@@ -1,14 +1,17 @@
-import asyncio
 import random
-from fastapi import FastAPI, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func
-from database import SessionLocal, engine
-import models, schemas, pricing, utils
+from fastapi import FastAPI, Depends, HTTPException, Query, Body, Response, Header
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, func, case, and_, or_
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine
+import database
+import models, schemas, pricing, utils, market, fare_history, cache, inventory, holds, pnr_allocator, hashing, auth, serializers, records, routes
 from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
+from collections import Counter, defaultdict
 
 
 models.Base.metadata.create_all(bind=engine)
@@ -16,16 +19,21 @@ models.Base.metadata.create_all(bind=engine)
 # -------------------------
 # Lifespan (replaces on_event)
 # -------------------------
-async def market_loop():
-    await asyncio.sleep(1)
-    while True:
-        await simulate_market_step()
-        await asyncio.sleep(30)  # run every 30 seconds
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(market_loop())
+    # warm airports/airlines so the first requests don't pay for the load
+    cache.reference_cache.load()
+    # market ticks run on their own thread; only the leader worker simulates
+    market.simulator.start()
+    # releases seats of checkouts that were never paid
+    holds.reaper.start()
+    # bcrypt runs in worker processes owned by the app
+    hashing.pool.start()
     yield
+    hashing.pool.stop()
+    holds.reaper.stop()
+    market.simulator.stop()
+    await async_engine.dispose()
 
 # Create FastAPI app once (before defining routes)
 app = FastAPI(title="Flight Booking Simulator (Upgraded)", lifespan=lifespan)
@@ -47,8 +55,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+class DBUsageMiddleware:
+    """
+    Sums how long each request held pooled connections (sync and async engines).
+    Plain ASGI so it also covers session cleanup that runs after the response is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        _, token = database.begin_request_usage()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            database.end_request_usage(token)
+
+app.add_middleware(DBUsageMiddleware)
+
 # -------------------------
 # DB Dependency
 # -------------------------
@@ -58,6 +87,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    # async endpoints await the database instead of holding a threadpool slot
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_pricing_context():
+    # one clock snapshot + seeded jitter for everything priced in this request
+    return pricing.PricingContext()
+
+def get_reference_cache():
+    # airports/airlines from memory (reloaded when invalidated or past its TTL)
+    return cache.reference_cache.ensure_fresh()
+
+async def get_async_reference_cache():
+    # only hop to a worker thread when the (blocking) reload is actually due
+    refs = cache.reference_cache
+    if refs.expired():
+        await run_in_threadpool(refs.load)
+    return refs
         
 # -------------------------
 # Root Endpoint 
@@ -67,347 +116,667 @@ def root():
     return {"message": "Flight Booking Simulator API is running"}
 
 
+# -------------------------
+# Metrics
+# -------------------------
+@app.get("/metrics/market")
+def market_metrics():
+    return market.simulator.snapshot()
+
+@app.get("/metrics/db")
+def db_metrics():
+    return {
+        "sync": database.pool_status(engine),
+        "async": database.pool_status(async_engine),
+        "request_hold": database.request_hold.snapshot(),
+    }
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    return {
+        "search": cache.search_cache.snapshot(),
+        "seat_maps": cache.seat_map_cache.snapshot(),
+        "reference": {"version": cache.reference_cache.version, "etag": cache.reference_cache.etag},
+    }
+
+@app.get("/metrics/holds")
+def hold_metrics():
+    return holds.reaper.snapshot()
+
+@app.get("/metrics/hashing")
+def hashing_metrics():
+    return hashing.pool.snapshot()
+
+@app.get("/metrics/routes")
+def route_metrics():
+    return routes.route_graph.snapshot()
+
+@app.get("/metrics/auth")
+def auth_metrics():
+    return auth.tokens.snapshot()
+
+@app.get("/metrics/pnr")
+def pnr_metrics():
+    return pnr_allocator.allocator.snapshot()
+
+@app.get("/metrics/fare-history")
+def fare_history_metrics():
+    return fare_history.writer.snapshot()
+
+
+# -------------------------
+# Keyset pagination
+# -------------------------
+# List endpoints keep returning plain arrays; the opaque cursor for the next
+# page (sort key + primary key of the last row) goes in this header.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def parse_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        values = utils.decode_cursor(cursor)
+    except ValueError:
+        values = None
+    if not values or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> list:
+    """
+    Trim a result fetched with limit + 1 rows and advertise the next page's cursor.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = utils.encode_cursor(*key(rows[-1]))
+    return rows
+
+def keyset_after(sort_expr, id_col, values, descending: bool):
+    """
+    Rows strictly after (sort value, id) in (sort_expr, id_col) order.
+    """
+    sort_value, last_id = values
+    if descending:
+        return or_(sort_expr < sort_value, and_(sort_expr == sort_value, id_col < last_id))
+    return or_(sort_expr > sort_value, and_(sort_expr == sort_value, id_col > last_id))
+
+def keyset_page(items: list, key, values, limit: int, descending: bool) -> list:
+    """
+    In-memory counterpart of keyset_after + ORDER BY + LIMIT limit + 1, for sort keys
+    the database can't compute: items in key(item) = (sort value, id) order, strictly after `values`.
+    """
+    items = sorted(items, key=key, reverse=descending)
+    if values:
+        after = tuple(values)
+        items = [i for i in items if (key(i) < after if descending else key(i) > after)]
+    return items[:limit + 1]
+
+
 # -------------------------
 # Flight listing & search
 # -------------------------
 @app.get("/flights", response_model=list[schemas.FlightOut])
-def list_flights(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def list_flights(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    refs: cache.ReferenceCache = Depends(get_reference_cache),
+):
     try:
-        src = aliased(models.Airport)
-        dst = aliased(models.Airport)
+        after = parse_cursor(cursor, 1)
+        rows = db.execute(
+            records.select_flight_views()
+            .where(models.Flight.flight_id > (after[0] if after else 0))
+            .order_by(models.Flight.flight_id)
+            .limit(limit + 1)
+        ).all()
+        flights = records.flight_views(set_next_cursor(response, rows, limit, lambda f: (f.flight_id,)))
 
-        flights = (
-            db.query(
-                models.Flight.flight_id,
-                models.Flight.flight_number,
-                models.Flight.departure_time,
-                models.Flight.arrival_time,
-                models.Flight.available_seats,
-                models.Flight.total_seats,
-                models.Flight.base_fare,
-                models.Airline.airline_name,
-                src.city.label("source_airport"),
-                dst.city.label("destination_airport"),
-            )
-            .join(models.Airline, models.Flight.airline_id == models.Airline.airline_id)
-            .join(src, models.Flight.source_airport == src.airport_id)
-            .join(dst, models.Flight.destination_airport == dst.airport_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        prices = pricing.snapshot_prices(flights, ctx)
 
-        result = []
-        for f in flights:
-            dynamic_price = pricing.calculate_dynamic_price(
-                base_fare=f.base_fare,
-                available_seats=f.available_seats,
-                total_seats=f.total_seats,
-                departure=f.departure_time,
-            )
-            result.append({
-                "flight_id": f.flight_id,
-                "flight_number": f.flight_number,
-                "departure_time": f.departure_time,
-                "arrival_time": f.arrival_time,
-                "available_seats": f.available_seats,
-                "total_seats": f.total_seats,
-                "base_fare": float(f.base_fare),
-                "dynamic_price": dynamic_price,
-                "airline_name": f.airline_name,
-                "source_airport": f.source_airport,
-                "destination_airport": f.destination_airport,
-            })
-
-        return result
+        # trusted rows: encoded straight to JSON, no response_model round trip
+        return serializers.flights_response(flights, prices, refs, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Flights endpoint error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/flights/{flight_id}", response_model=schemas.FlightOut)
-def get_flight_by_id(flight_id: int, db: Session = Depends(get_db)):
+async def get_flight_by_id(
+    flight_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    refs: cache.ReferenceCache = Depends(get_async_reference_cache),
+):
     """
     Return full flight details by flight_id, including airline and airport info.
     """
-    src = aliased(models.Airport)
-    dst = aliased(models.Airport)
+    row = (await db.execute(records.select_flight_views().where(models.Flight.flight_id == flight_id))).first()
 
-    f = (
-        db.query(
-            models.Flight.flight_id,
-            models.Flight.flight_number,
-            models.Flight.departure_time,
-            models.Flight.arrival_time,
-            models.Flight.available_seats,
-            models.Flight.total_seats,
-            models.Flight.base_fare,
-            models.Airline.airline_name,
-            src.city.label("source_airport"),
-            dst.city.label("destination_airport"),
-        )
-        .join(models.Airline, models.Flight.airline_id == models.Airline.airline_id)
-        .join(src, models.Flight.source_airport == src.airport_id)
-        .join(dst, models.Flight.destination_airport == dst.airport_id)
-        .filter(models.Flight.flight_id == flight_id)
-        .first()
-    )
-
-    if not f:
+    if not row:
         raise HTTPException(status_code=404, detail="Flight not found")
+    f = records.flight_view(row)
 
-    # ✅ Optionally compute dynamic fare for the response
-    dynamic_price = pricing.calculate_dynamic_price(
-        base_fare=f.base_fare,
-        available_seats=f.available_seats,
-        total_seats=f.total_seats,
-        departure=f.departure_time,
-    )
+    # ✅ Serve the market snapshot price (recomputed only if stale)
+    dynamic_price = pricing.snapshot_prices([f], ctx)[0]
+
+    return serializers.FastJSONResponse(serializers.flight_out(f, dynamic_price, refs))
 
-    return {
-        "flight_id": f.flight_id,
-        "flight_number": f.flight_number,
-        "departure_time": f.departure_time,
-        "arrival_time": f.arrival_time,
-        "available_seats": f.available_seats,
-        "total_seats": f.total_seats,
-        "base_fare": float(f.base_fare),
-        "dynamic_price": dynamic_price,
-        "airline_name": f.airline_name,
-        "source_airport": f.source_airport,
-        "destination_airport": f.destination_airport,
-    }
 
+# price-sorted searches matching at most this many flights are ordered by the price shown
+SEARCH_PRICE_SORT_MAX_ROWS = 2000
 
 @app.get("/search", response_model=list[schemas.FlightOut])
-def search_flights(
+async def search_flights(
+    response: Response,
     origin: str = Query(None),
     destination: str = Query(None),
     travel_date: str = Query(None),
     sort_by: str = Query("price", regex="^(price|duration)$"),
     order: str = Query("asc", regex="^(asc|desc)$"),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    refs: cache.ReferenceCache = Depends(get_async_reference_cache),
 ):
-    try:
-        src = aliased(models.Airport)
-        dst = aliased(models.Airport)
+    # identical searches are served from memory until a listed flight changes
+    cache_key = cache.search_cache.make_key(
+        origin=origin, destination=destination, travel_date=travel_date,
+        sort_by=sort_by, order=order, cursor=cursor, limit=limit,
+    )
+    cached = cache.search_cache.get(cache_key)
+    if cached is not None:
+        body, next_cursor = cached
+        return serializers.FastJSONResponse(body, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
-        q = (
-            db.query(
-                models.Flight.flight_id,
-                models.Flight.flight_number,
-                models.Flight.departure_time,
-                models.Flight.arrival_time,
-                models.Flight.available_seats,
-                models.Flight.total_seats,
-                models.Flight.base_fare,
-                models.Airline.airline_name,
-                src.city.label("source_airport"),
-                dst.city.label("destination_airport"),
-            )
-            .join(models.Airline, models.Flight.airline_id == models.Airline.airline_id)
-            .join(src, models.Flight.source_airport == src.airport_id)
-            .join(dst, models.Flight.destination_airport == dst.airport_id)
-        )
+    try:
+        after = parse_cursor(cursor, 2)
+        q = records.select_flight_views()
 
-        # Handle filters
+        # Handle filters: resolve cities/codes to airport ids and filter on the
+        # flights columns directly so ix_flights_route_departure can be used
         if origin:
-            q = q.filter(func.lower(src.city) == origin.lower())
+            q = q.where(models.Flight.source_airport.in_(refs.airport_ids(origin)))
         if destination:
-            q = q.filter(func.lower(dst.city) == destination.lower())
+            q = q.where(models.Flight.destination_airport.in_(refs.airport_ids(destination)))
 
         if travel_date:
-            td = datetime.strptime(travel_date, "%Y-%m-%d").date()
-            q = q.filter(func.date(models.Flight.departure_time) == td)
-
-        # Sorting
-        if sort_by == "price":
-            q = q.order_by(models.Flight.base_fare.asc() if order == "asc" else models.Flight.base_fare.desc())
-        elif sort_by == "duration":
-            duration_expr = func.extract("epoch", models.Flight.arrival_time - models.Flight.departure_time)
-            q = q.order_by(duration_expr.asc() if order == "asc" else duration_expr.desc())
-
-        flights = q.offset(skip).limit(limit).all()
-
-        result = []
-        for f in flights:
-            dynamic_price = pricing.calculate_dynamic_price(
-                base_fare=f.base_fare,
-                available_seats=f.available_seats,
-                total_seats=f.total_seats,
-                departure=f.departure_time,
+            try:
+                td = datetime.strptime(travel_date, "%Y-%m-%d").date()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="travel_date must be YYYY-MM-DD")
+            # half-open range instead of DATE(departure_time) keeps the filter sargable
+            day_start = datetime.combine(td, datetime.min.time())
+            q = q.where(
+                models.Flight.departure_time >= day_start,
+                models.Flight.departure_time < day_start + timedelta(days=1),
             )
-            result.append({
-                "flight_id": f.flight_id,
-                "flight_number": f.flight_number,
-                "departure_time": f.departure_time,
-                "arrival_time": f.arrival_time,
-                "available_seats": f.available_seats,
-                "total_seats": f.total_seats,
-                "base_fare": float(f.base_fare),
-                "dynamic_price": dynamic_price,
-                "airline_name": f.airline_name,
-                "source_airport": f.source_airport,
-                "destination_airport": f.destination_airport,
-            })
 
+        # Sorting (flight_id breaks ties so keyset pages are stable)
+        descending = order == "desc"
+        flights = None
+        if sort_by == "price":
+            # Order by the price users actually see: stale or never-priced snapshots are
+            # re-priced (pricing.snapshot_prices), which SQL can't do, so the flights of a
+            # route/date search are priced and paged in memory when there are few enough
+            rows = None
+            if origin or destination or travel_date:
+                rows = (await db.execute(
+                    q.order_by(models.Flight.flight_id).limit(SEARCH_PRICE_SORT_MAX_ROWS + 1)
+                )).all()
+            if rows is not None and len(rows) <= SEARCH_PRICE_SORT_MAX_ROWS:
+                candidates = records.flight_views(rows)
+                priced = list(zip(candidates, pricing.snapshot_prices(candidates, ctx)))
+                page = keyset_page(priced, lambda fp: (fp[1], fp[0].flight_id), after, limit, descending)
+                page = set_next_cursor(response, page, limit, lambda fp: (fp[1], fp[0].flight_id))
+                flights = [f for f, _ in page]
+                prices = [p for _, p in page]
+            else:
+                # unfiltered or too many to price per request: order by the stored snapshot instead
+                # (base fare before a flight's first market tick)
+                sort_expr = case(
+                    (models.Flight.price_updated_at.is_(None), models.Flight.base_fare),
+                    else_=models.Flight.current_price,
+                )
+        else:
+            sort_expr = func.extract("epoch", models.Flight.arrival_time - models.Flight.departure_time)
+
+        if flights is None:
+            if after:
+                q = q.where(keyset_after(sort_expr, models.Flight.flight_id, after, descending))
+            if descending:
+                q = q.order_by(sort_expr.desc(), models.Flight.flight_id.desc())
+            else:
+                q = q.order_by(sort_expr.asc(), models.Flight.flight_id.asc())
+
+            rows = (await db.execute(q.add_columns(sort_expr.label("sort_key")).limit(limit + 1))).all()
+            rows = set_next_cursor(response, rows, limit, lambda f: (float(f.sort_key), f.flight_id))
+            flights = records.flight_views(rows)
+
+            prices = pricing.snapshot_prices(flights, ctx)
+
+        # the cache keeps the encoded page, so hits skip serialization entirely
+        result = serializers.flights_response(flights, prices, refs, response)
+        cache.search_cache.put(
+            cache_key, (result.body, response.headers.get(NEXT_CURSOR_HEADER)), [f.flight_id for f in flights]
+        )
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Search endpoint error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/search/connections")
+def search_connections(
+    origin: str = Query(...),
+    destination: str = Query(...),
+    travel_date: str = Query(...),
+    max_stops: int = Query(routes.MAX_STOPS, ge=0, le=routes.MAX_STOPS),
+    min_layover: int = Query(routes.LAYOVER_MIN_MINUTES, ge=0, description="Minutes"),
+    max_layover: int = Query(routes.LAYOVER_MAX_MINUTES, ge=0, description="Minutes"),
+    passengers: int = Query(1, ge=1, le=9),
+    sort_by: str = Query("price", regex="^(price|duration)$"),
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    refs: cache.ReferenceCache = Depends(get_reference_cache),
+):
+    """
+    Direct, 1-stop and 2-stop itineraries whose first flight leaves on travel_date,
+    found on the in-memory route graph and priced with the current market prices.
+    """
+    try:
+        td = datetime.strptime(travel_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="travel_date must be YYYY-MM-DD")
+    if max_layover < min_layover:
+        raise HTTPException(status_code=400, detail="max_layover must be at least min_layover")
+    origins, destinations = refs.airport_ids(origin), refs.airport_ids(destination)
+    if not origins or not destinations:
+        raise HTTPException(status_code=404, detail="Unknown origin or destination")
+
+    try:
+        day_start = datetime.combine(td, datetime.min.time())
+        itineraries = routes.route_graph.ensure_fresh().connections(
+            origins,
+            destinations,
+            day_start,
+            day_start + timedelta(days=1),
+            max_stops=max_stops,
+            min_layover=timedelta(minutes=min_layover),
+            max_layover=timedelta(minutes=max_layover),
+        )
+        priced = routes.price_itineraries(db, itineraries, passengers, ctx)
+        results = [serializers.itinerary_out(legs, prices, passengers, refs) for legs, prices in priced]
+        if sort_by == "price":
+            results.sort(key=lambda r: (r["fare_per_passenger"], r["duration_minutes"]))
+        else:
+            results.sort(key=lambda r: (r["duration_minutes"], r["fare_per_passenger"]))
+        return serializers.FastJSONResponse(results[:limit])
+    except Exception as e:
+        print("❌ Connection search error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 # -------------------------
 # Seat Availability Endpoint
 # -------------------------
 @app.get("/flights/{flight_id}/seats")
 def get_seat_availability(flight_id: int, db: Session = Depends(get_db)):
     """
-    Returns total seats, available seats, and a simulated list of available seat numbers.
+    Returns total seats, available seats, and the free / taken seat labels from the seat inventory.
     """
-    flight = db.query(models.Flight).filter(models.Flight.flight_id == flight_id).first()
+    flight = (
+        db.query(models.Flight.flight_id, models.Flight.total_seats, models.Flight.available_seats)
+        .filter(models.Flight.flight_id == flight_id)
+        .first()
+    )
     if not flight:
         raise HTTPException(status_code=404, detail="Flight not found")
 
-    # Optional: generate a simple list of available seat numbers
-    total = flight.total_seats
-    available = flight.available_seats
-
-    # This generates seat numbers like [1, 2, 3, ... available]
-    available_seat_numbers = [i for i in range(1, total + 1)][:available]
+    free, taken = inventory.seat_map(db, flight.flight_id, flight.total_seats, flight.available_seats)
 
     return {
         "flight_id": flight.flight_id,
-        "total_seats": total,
-        "available_seats": available,
-        "available_seat_numbers": available_seat_numbers
+        "total_seats": flight.total_seats,
+        "available_seats": flight.available_seats,
+        "layout": inventory.seat_layout(flight.total_seats),
+        "available_seat_numbers": free,
+        "unavailableSeats": taken,
     }
 
 
+@app.get("/flights/{flight_id}/seatmap")
+async def get_seat_map(
+    flight_id: int,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="Return only seats changed after this version"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Compact seat map: layout metadata plus a base64 bitset of taken seats
+    (see inventory.encode_seat_bitmap), versioned by flights.seat_map_version.
+    Pollers send If-None-Match (304 when unchanged) or ?since=<version> for a delta.
+    """
+    flight = (
+        await db.execute(
+            select(
+                models.Flight.flight_id,
+                models.Flight.total_seats,
+                models.Flight.available_seats,
+                models.Flight.seat_map_version,
+            )
+            .where(models.Flight.flight_id == flight_id)
+        )
+    ).first()
+    if not flight:
+        raise HTTPException(status_code=404, detail="Flight not found")
+
+    version = flight.seat_map_version or 0
+    etag = inventory.seat_map_etag(flight_id, version, flight.available_seats)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    seats = inventory.seats_t
+    if version == 0:
+        # no seat rows yet: sold seats follow available_seats (inventory.presold_indexes),
+        # which moves without a version bump, so deltas list every seat and nothing is cached
+        sold = inventory.presold_indexes(
+            flight_id, flight.total_seats, flight.total_seats - (flight.available_seats or 0)
+        )
+        if since is not None:
+            sold = set(sold)
+            return {
+                "flight_id": flight_id,
+                "version": version,
+                "since": since,
+                "changes": [
+                    {"seat": label, "index": i, "taken": i in sold}
+                    for i, label in enumerate(inventory.seat_labels(flight.total_seats))
+                ],
+            }
+        return {
+            "flight_id": flight_id,
+            "version": version,
+            "total_seats": flight.total_seats,
+            "layout": inventory.seat_layout(flight.total_seats),
+            "encoding": "bitset-base64",
+            "taken": inventory.encode_seat_bitmap(sold, flight.total_seats),
+        }
+
+    if since is not None and since <= version:
+        changed = (
+            await db.execute(
+                select(seats.c.seat_no, seats.c.seat_index, seats.c.pnr)
+                .where(seats.c.flight_id == flight_id)
+                .where(seats.c.version > since)
+                .order_by(seats.c.seat_index)
+            )
+        ).all()
+        return {
+            "flight_id": flight_id,
+            "version": version,
+            "since": since,
+            "changes": [{"seat": r.seat_no, "index": r.seat_index, "taken": r.pnr is not None} for r in changed],
+        }
+
+    payload = cache.seat_map_cache.get(flight_id, version)
+    if payload is None:
+        taken = (
+            await db.execute(
+                select(seats.c.seat_index).where(seats.c.flight_id == flight_id).where(seats.c.pnr.isnot(None))
+            )
+        ).scalars().all()
+        payload = {
+            "flight_id": flight_id,
+            "version": version,
+            "total_seats": flight.total_seats,
+            "layout": inventory.seat_layout(flight.total_seats),
+            "encoding": "bitset-base64",
+            "taken": inventory.encode_seat_bitmap(taken, flight.total_seats),
+        }
+        cache.seat_map_cache.put(flight_id, version, payload)
+    return payload
+
+
 # -------------------------
 # Dynamic Price Endpoint
 # -------------------------
 @app.get("/flights/{flight_id}/price", response_model=schemas.PriceResponse)
-def get_price(flight_id: int, db: Session = Depends(get_db)):
-    f = db.query(models.Flight).filter(models.Flight.flight_id == flight_id).first()
-    if not f:
+def get_price(
+    flight_id: int,
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+):
+    row = db.execute(records.select_flight_views().where(models.Flight.flight_id == flight_id)).first()
+    if not row:
         raise HTTPException(404, "Flight not found")
-    price = pricing.calculate_dynamic_price(float(f.base_fare), f.available_seats, f.total_seats, f.departure_time)
+    f = records.flight_view(row)
+    price = pricing.snapshot_prices([f], ctx)[0]
     return {
         "flight_id": f.flight_id,
         "flight_number": f.flight_number,
         "dynamic_price": price,
-        "base_fare": float(f.base_fare),
-        "available_seats": f.available_seats
+        "base_fare": f.base_fare,
+        "available_seats": f.available_seats,
+        "priced_at": f.price_updated_at,
+    }
+# -------------------------
+# Fare History Endpoints
+# -------------------------
+MAX_FARE_FLIGHTS = 50
+
+def _fare_history_page(db, flight_ids, start, end, bucket, cursor, limit):
+    # aware query params (e.g. "...Z") would not compare with the naive UTC columns
+    end = utils.naive_utc(end) or datetime.utcnow()
+    start = utils.naive_utc(start) or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    after = None
+    if cursor:
+        try:
+            after = tuple(utils.decode_cursor(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items, last = fare_history.query_fare_buckets(db, flight_ids, start, end, bucket, after, limit)
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "items": items,
+        "next_cursor": utils.encode_cursor(*last) if last else None,
     }
+
+@app.get("/flights/{flight_id}/fares", response_model=schemas.FareHistoryPage)
+def get_flight_fares(
+    flight_id: int,
+    start: Optional[datetime] = Query(None, description="Range start (UTC), defaults to 7 days before end"),
+    end: Optional[datetime] = Query(None, description="Range end (UTC, exclusive), defaults to now"),
+    bucket: str = Query("hour", regex="^(hour|day)$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=2000),
+    db: Session = Depends(get_db),
+):
+    """
+    Time-bucketed open/high/low/close fare history for one flight.
+    """
+    return _fare_history_page(db, [flight_id], start, end, bucket, cursor, limit)
+
+@app.get("/fares", response_model=schemas.FareHistoryPage)
+def get_fares(
+    flight_ids: str = Query(..., description="Comma-separated flight ids"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    bucket: str = Query("hour", regex="^(hour|day)$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_db),
+):
+    """
+    Time-bucketed fare history for several flights, ordered by (flight_id, bucket_start).
+    """
+    try:
+        ids = {int(x) for x in flight_ids.split(",") if x.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="flight_ids must be comma-separated integers")
+    if not ids or len(ids) > MAX_FARE_FLIGHTS:
+        raise HTTPException(status_code=400, detail=f"Provide 1-{MAX_FARE_FLIGHTS} flight ids")
+    return _fare_history_page(db, ids, start, end, bucket, cursor, limit)
+
 # -------------------------
 # Airport Endpoints
 # -------------------------
 @app.get("/airports")
-def list_airports(db: Session = Depends(get_db)):
-    airports = (
-        db.query(models.Airport.airport_id, models.Airport.city, models.Airport.country)
-        .order_by(models.Airport.city.asc())
-        .all()
-    )
-    return [{"airport_id": a.airport_id, "city": a.city, "country": a.country} for a in airports]
+def list_airports(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    refs: cache.ReferenceCache = Depends(get_reference_cache),
+):
+    response.headers["ETag"] = refs.etag
+    if if_none_match == refs.etag:
+        return Response(status_code=304, headers={"ETag": refs.etag})
+    return refs.airport_list
+
+@app.post("/airports/cache/invalidate")
+def invalidate_reference_cache():
+    """
+    Reload airports and airlines now (call after editing either table).
+    """
+    cache.reference_cache.invalidate()
+    refs = cache.reference_cache.ensure_fresh()
+    return {"version": refs.version, "etag": refs.etag}
 
 
 # -------------------------
 # Passenger Endpoints
 # -------------------------
-@app.post("/passengers", response_model=schemas.PassengerOut, status_code=201)
-def create_passenger(payload: schemas.PassengerCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.Passenger).filter(models.Passenger.email == payload.email).first()
+def hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many sign-ins right now, please retry",
+        headers={"Retry-After": str(hashing.HASH_RETRY_AFTER_SECONDS)},
+    )
+
+async def hash_password(password: str) -> str:
+    """
+    Hash on the hashing process pool; 429 when its queue is full.
+    """
+    try:
+        return await hashing.pool.hash(password)
+    except hashing.HashingBusy:
+        raise hashing_busy()
+
+async def add_passenger(db: AsyncSession, payload: schemas.PassengerCreate, exists_detail: str):
+    existing = (
+        await db.execute(select(models.Passenger.passenger_id).where(models.Passenger.email == payload.email))
+    ).first()
     if existing:
-        raise HTTPException(status_code=400, detail="Passenger with this email already exists")
-    
+        raise HTTPException(status_code=400, detail=exists_detail)
+
     # Hash the password before storing
-    hashed_pw = utils.hash_password(payload.password)
-    
+    hashed_pw = await hash_password(payload.password)
+
     p = models.Passenger(
         full_name=payload.full_name,
         email=payload.email,
         phone=payload.phone,
         hashed_password=hashed_pw
     )
-    
     db.add(p)
-    db.commit()
-    db.refresh(p)
+    await db.commit()
+    await db.refresh(p)
     return p
 
+@app.post("/passengers", response_model=schemas.PassengerOut, status_code=201)
+async def create_passenger(payload: schemas.PassengerCreate, db: AsyncSession = Depends(get_async_db)):
+    return await add_passenger(db, payload, "Passenger with this email already exists")
+
 # Signup
 @app.post("/passengers/signup", response_model=schemas.PassengerOut, status_code=201)
-def signup_passenger(payload: schemas.PassengerCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.Passenger).filter(models.Passenger.email == payload.email).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Passenger already exists")
-    hashed_pw = utils.hash_password(payload.password)
-    p = models.Passenger(
-        full_name=payload.full_name,
-        email=payload.email,
-        phone=payload.phone,
-        hashed_password=hashed_pw
-    )
-    db.add(p)
-    db.commit()
-    db.refresh(p)
-    return p
+async def signup_passenger(payload: schemas.PassengerCreate, db: AsyncSession = Depends(get_async_db)):
+    return await add_passenger(db, payload, "Passenger already exists")
 
 # Login
 @app.post("/passengers/login")
-def login_passenger(payload: schemas.PassengerLogin, db: Session = Depends(get_db)):
-    passenger = db.query(models.Passenger).filter(models.Passenger.email == payload.email).first()
-    
+async def login_passenger(payload: schemas.PassengerLogin, db: AsyncSession = Depends(get_async_db)):
+    passenger = (
+        await db.execute(select(models.Passenger).where(models.Passenger.email == payload.email))
+    ).scalars().first()
+
     if not passenger:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
+
     try:
-        valid = utils.verify_password(payload.password, passenger.hashed_password)
+        valid, new_hash = await hashing.pool.verify(payload.password, passenger.hashed_password)
+    except hashing.HashingBusy:
+        raise hashing_busy()
     except Exception:
-        valid = False
-    
+        valid, new_hash = False, None
+
     if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
+
+    if new_hash:
+        # stored hash used an older cost factor: replace it now that we know the password
+        passenger.hashed_password = new_hash
+        await db.commit()
+
+    # bcrypt once per session; later requests only check the token's HMAC
     return {
         "passenger_id": passenger.passenger_id,
         "full_name": passenger.full_name,
-        "email": passenger.email
+        "email": passenger.email,
+        **auth.tokens.issue(passenger.passenger_id),
     }
 
+@app.post("/passengers/logout")
+def logout_passenger(claims: dict = Depends(auth.current_claims)):
+    auth.tokens.revoke(claims)
+    return {"message": "Logged out"}
+
 
 # -------------------------
 # Booking Endpoints
 # -------------------------
+def owns_bookings(bookings, passenger_id: int) -> bool:
+    """
+    A PNR belongs to whoever booked it; other passengers get a 404 as if it didn't exist.
+    """
+    return bool(bookings) and all(b.passenger_id == passenger_id for b in bookings)
+
 @app.post("/bookings", response_model=schemas.BookingOut, status_code=201)
-def create_booking(payload: schemas.BookingCreate, db: Session = Depends(get_db)):
+def create_booking(
+    payload: schemas.BookingCreate,
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    current_id: int = Depends(auth.current_passenger_id),
+):
+    auth.require_passenger(payload.passenger_id, current_id)
     try:
-        flight = db.query(models.Flight).filter(models.Flight.flight_id == payload.flight_id).with_for_update().first()
-        if not flight:
-            raise HTTPException(status_code=404, detail="Flight not found")
-        if flight.available_seats <= 0:
-            raise HTTPException(status_code=400, detail="No seats available")
-
         passenger = db.query(models.Passenger).filter(models.Passenger.passenger_id == payload.passenger_id).first()
         if not passenger:
             raise HTTPException(status_code=404, detail="Passenger not found")
 
-        seat_no = payload.seat_no or random.randint(1, flight.total_seats)
-        price = pricing.calculate_dynamic_price(float(flight.base_fare), flight.available_seats, flight.total_seats, flight.departure_time)
-        flight.available_seats = max(0, flight.available_seats - 1)
+        pnr = pnr_allocator.allocator.next()
+
+        # read + price without locks, then a version-checked conditional seat decrement
+        reserved = inventory.reserve_seats(db, [payload.flight_id], 1, ctx)
+        if reserved is None:
+            raise HTTPException(status_code=404, detail="Flight not found")
+        (flight, price), = reserved
 
-        pnr = None
-        for _ in range(5):
-            candidate = utils.generate_pnr(8)
-            if db.query(models.Booking).filter(models.Booking.pnr == candidate).first() is None:
-                pnr = candidate
-                break
-        if pnr is None:
-            pnr = f"PNR{int(datetime.now(timezone.utc).timestamp())}"
+        seat_no = inventory.claim_seats(db, flight.flight_id, flight.total_seats, pnr, [payload.seat_no])[0]
 
         booking = models.Booking(
             flight_id=payload.flight_id,
@@ -419,24 +788,48 @@ def create_booking(payload: schemas.BookingCreate, db: Session = Depends(get_db)
             pnr=pnr
         )
         db.add(booking)
-        db.add(models.FareHistory(flight_id=flight.flight_id, price=price))
         db.commit()
+        cache.search_cache.invalidate_flights([flight.flight_id])
+        fare_history.writer.record(flight.flight_id, price)
         db.refresh(booking)
         return booking
     except HTTPException:
         db.rollback()
         raise
+    except inventory.SeatUnavailable as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(exc))
     except Exception as exc:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Booking failed: {exc}")
 
 @app.get("/bookings")
 def list_bookings(
+    response: Response,
     passenger_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    refs: cache.ReferenceCache = Depends(get_reference_cache),
+    current_id: int = Depends(auth.current_passenger_id),
 ):
-    src = aliased(models.Airport)
-    dst = aliased(models.Airport)
+    """
+    The logged-in passenger's bookings grouped by PNR, newest first, `limit` PNRs per page.
+    """
+    auth.require_passenger(passenger_id, current_id)
+    passenger_id = current_id
+    after = parse_cursor(cursor, 1)
+
+    # Page over PNRs first (keyed by their newest booking_id), then load their legs
+    last_id = func.max(models.Booking.booking_id)
+    pnr_q = db.query(models.Booking.pnr, last_id.label("last_id")).group_by(models.Booking.pnr)
+    pnr_q = pnr_q.filter(models.Booking.passenger_id == passenger_id)
+    if after:
+        pnr_q = pnr_q.having(last_id < after[0])
+    page = pnr_q.order_by(last_id.desc()).limit(limit + 1).all()
+    page = set_next_cursor(response, page, limit, lambda p: (p.last_id,))
+    if not page:
+        return []
 
     q = (
         db.query(
@@ -449,26 +842,22 @@ def list_bookings(
             models.Booking.seat_no,
             models.Booking.booking_date,
             models.Flight.flight_number,
-            models.Airline.airline_name,
-            src.city.label("source_city"),
-            dst.city.label("destination_city"),
+            models.Flight.airline_id,
+            models.Flight.source_airport,
+            models.Flight.destination_airport,
         )
         .join(models.Flight, models.Booking.flight_id == models.Flight.flight_id)
-        .join(models.Airline, models.Flight.airline_id == models.Airline.airline_id)
-        .join(src, models.Flight.source_airport == src.airport_id)
-        .join(dst, models.Flight.destination_airport == dst.airport_id)
     )
 
-    if passenger_id is not None:
-        q = q.filter(models.Booking.passenger_id == passenger_id)
+    q = q.filter(models.Booking.pnr.in_([p.pnr for p in page]), models.Booking.passenger_id == passenger_id)
 
-    results = q.all()
+    results = q.order_by(models.Booking.booking_id).all()
 
-    # Group by PNR and detect overall status
-    grouped = {}
+    # Group by PNR (in page order) and detect overall status
+    grouped = {p.pnr: None for p in page}
     for row in results:
         pnr = row.pnr
-        if pnr not in grouped:
+        if grouped[pnr] is None:
             grouped[pnr] = {
                 "pnr": pnr,
                 "trip_type": row.trip_type,
@@ -476,9 +865,9 @@ def list_bookings(
                 "fare_paid": float(row.fare_paid),
                 "seat_no": [row.seat_no],
                 "flight_number": row.flight_number,
-                "airline_name": row.airline_name,
-                "source": row.source_city,
-                "destination": row.destination_city,
+                "airline_name": refs.airline_name(row.airline_id),
+                "source": refs.airport_city(row.source_airport),
+                "destination": refs.airport_city(row.destination_airport),
                 "return_flight_id": row.return_flight_id,
                 "is_return_leg": row.is_return_leg,
                 "booking_date": row.booking_date,
@@ -491,11 +880,15 @@ def list_bookings(
     # Compute overall status
     bookings = []
     for g in grouped.values():
+        if g is None:
+            continue
         statuses = g["status_list"]
         if all(s == "CANCELLED" for s in statuses):
             overall = "CANCELLED"
         elif any(s == "PARTIALLY_CANCELLED" for s in statuses):
             overall = "PARTIALLY_CANCELLED"
+        elif statuses[0] in ("EXPIRED", "PAYMENT_FAILED") and len(set(statuses)) == 1:
+            overall = statuses[0]  # seats were released
         else:
             overall = "CONFIRMED"
 
@@ -506,43 +899,44 @@ def list_bookings(
 
 
 @app.get("/bookings/{pnr}", response_model=dict)
-def get_booking_by_pnr(pnr: str, db: Session = Depends(get_db)):
+async def get_booking_by_pnr(
+    pnr: str,
+    db: AsyncSession = Depends(get_async_db),
+    refs: cache.ReferenceCache = Depends(get_async_reference_cache),
+    current_id: int = Depends(auth.current_passenger_id),
+):
     """
     Return full booking details including all passengers and readable flight info.
     Works for both one-way and roundtrip bookings.
     """
-    bookings = db.query(models.Booking).filter(models.Booking.pnr == pnr).all()
-    if not bookings:
+    bookings = (await db.execute(select(models.Booking).where(models.Booking.pnr == pnr))).scalars().all()
+    if not owns_bookings(bookings, current_id):
         raise HTTPException(status_code=404, detail="Booking not found")
 
     # Collect all flight IDs and booking statuses
     flight_ids = [b.flight_id for b in bookings]
 
-    src = aliased(models.Airport)
-    dst = aliased(models.Airport)
-
     flights = (
-        db.query(
-            models.Flight.flight_id,
-            models.Flight.flight_number,
-            models.Flight.departure_time,
-            models.Flight.arrival_time,
-            models.Airline.airline_name,
-            src.city.label("source_city"),
-            dst.city.label("destination_city"),
+        await db.execute(
+            select(
+                models.Flight.flight_id,
+                models.Flight.flight_number,
+                models.Flight.departure_time,
+                models.Flight.arrival_time,
+                models.Flight.airline_id,
+                models.Flight.source_airport,
+                models.Flight.destination_airport,
+            )
+            .where(models.Flight.flight_id.in_(flight_ids))
         )
-        .join(models.Airline, models.Flight.airline_id == models.Airline.airline_id)
-        .join(src, models.Flight.source_airport == src.airport_id)
-        .join(dst, models.Flight.destination_airport == dst.airport_id)
-        .filter(models.Flight.flight_id.in_(flight_ids))
-        .all()
-    )
+    ).all()
 
     passenger_records = (
-        db.query(models.BookingPassenger)
-        .filter(models.BookingPassenger.booking_id.in_([b.booking_id for b in bookings]))
-        .all()
-    )
+        await db.execute(
+            select(models.BookingPassenger)
+            .where(models.BookingPassenger.booking_id.in_([b.booking_id for b in bookings]))
+        )
+    ).scalars().all()
 
     passengers = [
         {
@@ -556,15 +950,16 @@ def get_booking_by_pnr(pnr: str, db: Session = Depends(get_db)):
     ]
 
     # Combine flight and booking data clearly
+    flights_by_id = {f.flight_id: f for f in flights}
     flight_data = []
     for b in bookings:
-        f = next((fl for fl in flights if fl.flight_id == b.flight_id), None)
+        f = flights_by_id.get(b.flight_id)
         if f:
             flight_data.append({
                 "flight_number": f.flight_number,
-                "airline_name": f.airline_name,
-                "source": f.source_city,
-                "destination": f.destination_city,
+                "airline_name": refs.airline_name(f.airline_id),
+                "source": refs.airport_city(f.source_airport),
+                "destination": refs.airport_city(f.destination_airport),
                 "departure_time": f.departure_time,
                 "arrival_time": f.arrival_time,
                 "status": b.status,  # ✅ Each leg shows its own status
@@ -580,6 +975,8 @@ def get_booking_by_pnr(pnr: str, db: Session = Depends(get_db)):
         overall_status = "CANCELLED"
     elif any(b.status == "PARTIALLY_CANCELLED" for b in bookings):
         overall_status = "PARTIALLY_CANCELLED"
+    elif bookings[0].status in ("EXPIRED", "PAYMENT_FAILED") and len({b.status for b in bookings}) == 1:
+        overall_status = bookings[0].status  # seats were released
 
     return {
         "pnr": pnr,
@@ -593,18 +990,46 @@ def get_booking_by_pnr(pnr: str, db: Session = Depends(get_db)):
 
 
 @app.post("/bookings/{pnr}/pay")
-def pay_booking(pnr: str, db: Session = Depends(get_db)):
-    bookings = db.query(models.Booking).filter(models.Booking.pnr == pnr).all()
+def pay_booking(
+    pnr: str,
+    db: Session = Depends(get_db),
+    current_id: int = Depends(auth.current_passenger_id),
+):
+    """
+    Pay for a held booking: success turns the seat hold into a confirmed booking,
+    failure (or an expired hold) releases the seats.
+    """
+    bookings = db.query(models.Booking.status, models.Booking.passenger_id).filter(models.Booking.pnr == pnr).all()
 
-    if not bookings:
+    if not owns_bookings(bookings, current_id):
         raise HTTPException(status_code=404, detail="Booking not found")
+    if not any(b.status == "PENDING_PAYMENT" for b in bookings):
+        if any(b.status == "EXPIRED" for b in bookings):
+            raise HTTPException(status_code=410, detail="Seat hold expired, please book again")
+        raise HTTPException(status_code=409, detail=f"Booking is not awaiting payment ({bookings[0].status})")
 
     success = random.random() < 0.9
-
-    for b in bookings:
-        b.status = "CONFIRMED" if success else "PAYMENT_FAILED"
-
-    db.commit()
+    now = datetime.utcnow()
+
+    if success:
+        # conditional on the hold still being live, so it can't race the reaper
+        paid = db.execute(
+            update(models.Booking.__table__)
+            .where(models.Booking.pnr == pnr)
+            .where(models.Booking.status == "PENDING_PAYMENT")
+            .where(or_(models.Booking.hold_expires_at.is_(None), models.Booking.hold_expires_at > now))
+            .values(status="CONFIRMED", hold_expires_at=None)
+        ).rowcount
+        if not paid:
+            released = holds.release_holds(db, [pnr], now)
+            db.commit()
+            cache.search_cache.invalidate_flights(released)
+            raise HTTPException(status_code=410, detail="Seat hold expired, please book again")
+        db.commit()
+    else:
+        released = holds.release_holds(db, [pnr], now, status="PAYMENT_FAILED", expired_only=False)
+        db.commit()
+        cache.search_cache.invalidate_flights(released)
 
     return {
         "message": "Payment successful" if success else "Payment failed",
@@ -621,7 +1046,8 @@ from fastapi import Query
 def cancel_booking(
     pnr: str,
     leg: str | None = Query(default=None, description="Use 'return' to cancel only the return flight"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_id: int = Depends(auth.current_passenger_id),
 ):
     try:
         # Fetch all bookings under this PNR
@@ -631,44 +1057,47 @@ def cancel_booking(
             .with_for_update()
             .all()
         )
-        if not bookings:
+        if not owns_bookings(bookings, current_id):
             raise HTTPException(status_code=404, detail="Booking not found")
 
-        cancelled_count = 0
+        # ✅ Cancel only return flight(s), or the entire trip
+        legs = [b for b in bookings if b.is_return_leg] if leg == "return" else bookings
+        cancelled = [b for b in legs if b.status not in holds.RELEASED_STATUSES]
+        cancelled_count = len(cancelled)
+
+        seats_by_flight = defaultdict(list)
+        for b in cancelled:
+            seats_by_flight[b.flight_id].append(b.seat_no)
+        # flight_id -> seats going back on sale
+        seats_returned = Counter({fid: len(seats) for fid, seats in seats_by_flight.items()})
+
+        if cancelled:
+            # one seat release per flight, one status update for every leg
+            for flight_id, seat_nos in seats_by_flight.items():
+                inventory.release_seats(db, flight_id, pnr, seat_nos)
+            db.execute(
+                update(models.Booking.__table__)
+                .where(models.Booking.booking_id.in_([b.booking_id for b in cancelled]))
+                .values(status="CANCELLED", hold_expires_at=None)
+            )
 
-        # ✅ Cancel only return flight(s)
         if leg == "return":
-            for b in bookings:
-                if b.is_return_leg:  # ✅ this marks the return leg correctly
-                    if b.status != "CANCELLED":
-                        flight = db.query(models.Flight).filter(models.Flight.flight_id == b.flight_id).first()
-                        if flight:
-                            flight.available_seats = min(flight.total_seats, flight.available_seats + 1)
-                        b.status = "CANCELLED"
-                        cancelled_count += 1
-
-            # ✅ Mark onward flight(s) as partially cancelled
+            # ✅ Mark paid onward flight(s) as partially cancelled; unpaid ones stay
+            # PENDING_PAYMENT so they can still be paid for, or reaped when the hold lapses
             db.query(models.Booking).filter(
                 models.Booking.pnr == pnr,
-                models.Booking.is_return_leg == False
-            ).update({"status": "PARTIALLY_CANCELLED"})
-
-        # ✅ Cancel entire trip
-        else:
-            for b in bookings:
-                if b.status == "CANCELLED":
-                    continue
-                flight = db.query(models.Flight).filter(models.Flight.flight_id == b.flight_id).first()
-                if flight:
-                    flight.available_seats = min(flight.total_seats, flight.available_seats + 1)
-                b.status = "CANCELLED"
-                cancelled_count += 1
+                models.Booking.is_return_leg == False,
+                models.Booking.status.notin_(("PENDING_PAYMENT",) + holds.RELEASED_STATUSES),
+            ).update({"status": "PARTIALLY_CANCELLED"}, synchronize_session=False)
 
         if cancelled_count == 0:
             db.rollback()
             return {"message": "Already cancelled", "pnr": pnr}
 
+        # atomic increments (capped at total_seats) instead of read-modify-write on each flight
+        inventory.return_seats(db, seats_returned)
         db.commit()
+        cache.search_cache.invalidate_flights(seats_returned)
 
         return {
             "message": f"Cancelled {cancelled_count} booking(s)",
@@ -677,13 +1106,35 @@ def cancel_booking(
             "partial": leg == "return"
         }
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as exc:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Cancel failed: {exc}")
 
     
+def booking_ids_by_seat(db: Session, pnrs) -> dict:
+    """
+    {(flight_id, seat_no): booking_id} for freshly inserted bookings, read back in one
+    query (a seat is held by at most one booking per flight, so the key is unique).
+    """
+    rows = db.execute(
+        select(models.Booking.booking_id, models.Booking.flight_id, models.Booking.seat_no)
+        .where(models.Booking.pnr.in_(list(pnrs)))
+        .where(models.Booking.status == "PENDING_PAYMENT")
+    ).all()
+    return {(r.flight_id, r.seat_no): r.booking_id for r in rows}
+
+
 @app.post("/bookings/roundtrip", response_model=dict)
-def book_roundtrip(booking_data: schemas.RoundTripBookingCreate, db: Session = Depends(get_db)):
+def book_roundtrip(
+    booking_data: schemas.RoundTripBookingCreate,
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    current_id: int = Depends(auth.current_passenger_id),
+):
+    auth.require_passenger(booking_data.owner_passenger_id, current_id)
     try:
         onward_flight_id = booking_data.onward_flight_id
         return_flight_id = booking_data.return_flight_id
@@ -694,111 +1145,119 @@ def book_roundtrip(booking_data: schemas.RoundTripBookingCreate, db: Session = D
         if total_passengers == 0:
             raise HTTPException(status_code=400, detail="At least one passenger is required.")
 
-        # Fetch flights and owner
-        onward_flight = db.query(models.Flight).filter(models.Flight.flight_id == onward_flight_id).with_for_update().first()
-        return_flight = db.query(models.Flight).filter(models.Flight.flight_id == return_flight_id).with_for_update().first()
         owner = db.query(models.Passenger).filter(models.Passenger.passenger_id == owner_passenger_id).first()
-
-        if not onward_flight or not return_flight:
-            raise HTTPException(status_code=404, detail="One or both flights not found")
         if not owner:
             raise HTTPException(status_code=404, detail="Owner passenger not found")
-        if onward_flight.available_seats < total_passengers or return_flight.available_seats < total_passengers:
-            raise HTTPException(status_code=400, detail="Not enough seats on one or both flights.")
+
+        # Generate PNRs before any seat is taken, so the allocator (which may refill its
+        # block on its own connection) never runs while this transaction holds flight rows.
+        # Whether the second one is needed is only known once the airlines are read.
+        first_pnr = pnr_allocator.allocator.next()
+        second_pnr = pnr_allocator.allocator.next()
+
+        # Read + price both flights without locks, then take seats with
+        # version-checked conditional decrements (re-read and re-priced on conflict)
+        reserved = inventory.reserve_seats(db, [onward_flight_id, return_flight_id], total_passengers, ctx)
+        if reserved is None:
+            raise HTTPException(status_code=404, detail="One or both flights not found")
+        (onward_flight, onward_price_per), (return_flight, return_price_per) = reserved
 
         # Determine if flights are same airline
         same_airline = onward_flight.airline_id == return_flight.airline_id
 
-        # Generate PNR(s)
+        # Assign PNR(s)
         if same_airline:
             # ✅ Single PNR for whole itinerary
-            onward_pnr = utils.generate_unique_pnr()
+            onward_pnr = first_pnr
             return_pnr = onward_pnr
         else:
             # ✅ Different PNR per airline
-            onward_pnr = utils.generate_unique_pnr()
-            return_pnr = utils.generate_unique_pnr()
+            onward_pnr = first_pnr
+            return_pnr = second_pnr
 
         bookings_created = []
+        hold_expires_at = holds.hold_deadline()
 
-        # Prices
-        onward_price_per = pricing.calculate_dynamic_price(
-            float(onward_flight.base_fare), onward_flight.available_seats, onward_flight.total_seats, onward_flight.departure_time
+        # --- Claim seat numbers (conditional updates, no flight-row locks) ---
+        onward_seats = inventory.claim_seats(
+            db, onward_flight.flight_id, onward_flight.total_seats, onward_pnr, [p.seat_no for p in passengers]
         )
-        return_price_per = pricing.calculate_dynamic_price(
-            float(return_flight.base_fare), return_flight.available_seats, return_flight.total_seats, return_flight.departure_time
+        return_seats = inventory.claim_seats(
+            db, return_flight.flight_id, return_flight.total_seats, return_pnr, [p.return_seat_no for p in passengers]
         )
 
         # --- Create bookings for each passenger ---
-        for p in passengers:
-            onward_seat = p.seat_no or str(random.randint(1, onward_flight.total_seats))
-            return_seat = p.return_seat_no or str(random.randint(1, return_flight.total_seats))
-
-            # Onward Booking
-            onward_booking = models.Booking(
-                flight_id=onward_flight_id,
-                passenger_id=owner_passenger_id,
-                seat_no=onward_seat,
-                fare_paid=onward_price_per,
-                total_fare=onward_price_per + return_price_per,
-                booking_date=datetime.now(timezone.utc),
-                status="PENDING_PAYMENT",
-                pnr=onward_pnr,
-                trip_type=models.TripType.ROUND_TRIP,
-                return_flight_id=return_flight_id,
-                is_return_leg=False 
-            )
-            db.add(onward_booking)
-            db.flush()
-
-            db.add(models.BookingPassenger(
-                booking_id=onward_booking.booking_id,
-                full_name=p.full_name,
-                age=p.age,
-                gender=p.gender,
-                seat_no=onward_seat,
-                return_seat_no=return_seat
-            ))
-
-            # Return Booking
-            return_booking = models.Booking(
-                flight_id=return_flight_id,
-                passenger_id=owner_passenger_id,
-                seat_no=return_seat,
-                fare_paid=return_price_per,
-                total_fare=onward_price_per + return_price_per,
-                booking_date=datetime.now(timezone.utc),
-                status="PENDING_PAYMENT",
-                pnr=return_pnr,
-                trip_type=models.TripType.ROUND_TRIP,
-                return_flight_id=onward_flight_id,
-                is_return_leg=True 
-            )
-            db.add(return_booking)
-            db.flush()
+        # All rows are built first and written in a fixed number of statements
+        # (bookings, id read-back, passengers) whatever the party size
+        booked_at = datetime.now(timezone.utc)
+        total_per_passenger = onward_price_per + return_price_per
+        leg_rows = []
+        for onward_seat, return_seat in zip(onward_seats, return_seats):
+            leg_rows.append({
+                "flight_id": onward_flight_id,
+                "passenger_id": owner_passenger_id,
+                "seat_no": onward_seat,
+                "fare_paid": onward_price_per,
+                "total_fare": total_per_passenger,
+                "booking_date": booked_at,
+                "status": "PENDING_PAYMENT",
+                "pnr": onward_pnr,
+                "trip_type": models.TripType.ROUND_TRIP,
+                "return_flight_id": return_flight_id,
+                "is_return_leg": False,
+                "hold_expires_at": hold_expires_at,
+            })
+            leg_rows.append({
+                "flight_id": return_flight_id,
+                "passenger_id": owner_passenger_id,
+                "seat_no": return_seat,
+                "fare_paid": return_price_per,
+                "total_fare": total_per_passenger,
+                "booking_date": booked_at,
+                "status": "PENDING_PAYMENT",
+                "pnr": return_pnr,
+                "trip_type": models.TripType.ROUND_TRIP,
+                "return_flight_id": onward_flight_id,
+                "is_return_leg": True,
+                "hold_expires_at": hold_expires_at,
+            })
+        db.execute(insert(models.Booking.__table__), leg_rows)
+        booking_ids = booking_ids_by_seat(db, {onward_pnr, return_pnr})
+
+        db.execute(insert(models.BookingPassenger.__table__), [
+            {
+                "booking_id": booking_ids[(onward_flight_id, onward_seat)],
+                "full_name": p.full_name,
+                "age": p.age,
+                "gender": p.gender,
+                "seat_no": onward_seat,
+                "return_seat_no": return_seat,
+            }
+            for p, onward_seat, return_seat in zip(passengers, onward_seats, return_seats)
+        ])
 
+        for p, onward_seat, return_seat in zip(passengers, onward_seats, return_seats):
             bookings_created.append({
-                "onward_booking_id": onward_booking.booking_id,
-                "return_booking_id": return_booking.booking_id,
+                "onward_booking_id": booking_ids[(onward_flight_id, onward_seat)],
+                "return_booking_id": booking_ids[(return_flight_id, return_seat)],
                 "passenger_name": p.full_name,
                 "onward_seat_no": onward_seat,
                 "return_seat_no": return_seat,
                 "onward_fare": float(onward_price_per),
                 "return_fare": float(return_price_per),
-                "total_fare": float(onward_price_per + return_price_per),
+                "total_fare": float(total_per_passenger),
                 "onward_pnr": onward_pnr,
                 "return_pnr": return_pnr if not same_airline else None
             })
 
-        # --- Update seat availability ---
-        onward_flight.available_seats -= total_passengers
-        return_flight.available_seats -= total_passengers
-
-        # Record fare history
-        db.add(models.FareHistory(flight_id=onward_flight.flight_id, price=onward_price_per))
-        db.add(models.FareHistory(flight_id=return_flight.flight_id, price=return_price_per))
-
         db.commit()
+        cache.search_cache.invalidate_flights([onward_flight.flight_id, return_flight.flight_id])
+        holds.reaper.add(onward_pnr, hold_expires_at)
+        holds.reaper.add(return_pnr, hold_expires_at)
+
+        # Record fare history (buffered)
+        fare_history.writer.record(onward_flight.flight_id, onward_price_per)
+        fare_history.writer.record(return_flight.flight_id, return_price_per)
         primary_booking_id = bookings_created[0]["onward_booking_id"] if bookings_created else None
 
         return {
@@ -807,19 +1266,32 @@ def book_roundtrip(booking_data: schemas.RoundTripBookingCreate, db: Session = D
             "onward_pnr": onward_pnr,
             "return_pnr": return_pnr if not same_airline else None,
             "primary_booking_id": primary_booking_id,
+            "hold_expires_at": hold_expires_at,
             "bookings": bookings_created
         }
 
+    except HTTPException:
+        db.rollback()
+        raise
+    except inventory.SeatUnavailable as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating roundtrip booking: {e}")
 
 @app.post("/bookings/oneway", response_model=dict, status_code=201)
-def book_oneway(booking_data: schemas.RoundTripBookingCreate, db: Session = Depends(get_db)):
+def book_oneway(
+    booking_data: schemas.RoundTripBookingCreate,
+    db: Session = Depends(get_db),
+    ctx: pricing.PricingContext = Depends(get_pricing_context),
+    current_id: int = Depends(auth.current_passenger_id),
+):
     """
     Create a one-way booking for multiple passengers.
     Generates a single shared PNR for all passengers.
     """
+    auth.require_passenger(booking_data.owner_passenger_id, current_id)
     try:
         flight_id = booking_data.onward_flight_id
         owner_passenger_id = booking_data.owner_passenger_id
@@ -829,110 +1301,91 @@ def book_oneway(booking_data: schemas.RoundTripBookingCreate, db: Session = Depe
         if total_passengers == 0:
             raise HTTPException(status_code=400, detail="At least one passenger is required.")
 
-        # Fetch flight and owner
-        flight = db.query(models.Flight).filter(models.Flight.flight_id == flight_id).with_for_update().first()
         owner = db.query(models.Passenger).filter(models.Passenger.passenger_id == owner_passenger_id).first()
-
-        if not flight:
-            raise HTTPException(status_code=404, detail="Flight not found")
         if not owner:
             raise HTTPException(status_code=404, detail="Owner passenger not found")
-        if flight.available_seats < total_passengers:
-            raise HTTPException(status_code=400, detail="Not enough seats available")
 
         # Generate a single PNR
-        shared_pnr = utils.generate_unique_pnr()
+        shared_pnr = pnr_allocator.allocator.next()
 
-        # Calculate dynamic price
-        price_per_passenger = pricing.calculate_dynamic_price(
-            float(flight.base_fare), flight.available_seats, flight.total_seats, flight.departure_time
+        # Read + price without locks, then a version-checked conditional seat decrement
+        reserved = inventory.reserve_seats(db, [flight_id], total_passengers, ctx)
+        if reserved is None:
+            raise HTTPException(status_code=404, detail="Flight not found")
+        (flight, price_per_passenger), = reserved
+
+        # Claim seat numbers (conditional updates, no flight-row lock)
+        seat_nos = inventory.claim_seats(
+            db, flight.flight_id, flight.total_seats, shared_pnr, [p.seat_no for p in passengers]
         )
 
         bookings_created = []
+        hold_expires_at = holds.hold_deadline()
+
+        # Build every row first: one multi-row INSERT for the bookings, one read-back
+        # of their ids, one INSERT for the passengers, whatever the party size
+        booked_at = datetime.now(timezone.utc)
+        db.execute(insert(models.Booking.__table__), [
+            {
+                "flight_id": flight.flight_id,
+                "passenger_id": owner_passenger_id,
+                "seat_no": seat_no,
+                "fare_paid": price_per_passenger,
+                "total_fare": price_per_passenger,  # For one-way, total_fare = fare_paid
+                "booking_date": booked_at,
+                "status": "PENDING_PAYMENT",
+                "pnr": shared_pnr,
+                "trip_type": models.TripType.ONE_WAY,
+                "is_return_leg": False,
+                "hold_expires_at": hold_expires_at,
+            }
+            for seat_no in seat_nos
+        ])
+        booking_ids = booking_ids_by_seat(db, {shared_pnr})
+
+        # Save passenger details
+        db.execute(insert(models.BookingPassenger.__table__), [
+            {
+                "booking_id": booking_ids[(flight.flight_id, seat_no)],
+                "full_name": p.full_name,
+                "age": p.age,
+                "gender": p.gender,
+                "seat_no": seat_no,
+            }
+            for p, seat_no in zip(passengers, seat_nos)
+        ])
 
-        for p in passengers:
-            seat_no = p.seat_no or str(random.randint(1, flight.total_seats))
-
-            booking = models.Booking(
-                flight_id=flight.flight_id,
-                passenger_id=owner_passenger_id,
-                seat_no=seat_no,
-                fare_paid=price_per_passenger,
-                total_fare=price_per_passenger,  # For one-way, total_fare = fare_paid
-                booking_date=datetime.now(timezone.utc),
-                status="PENDING_PAYMENT",
-                pnr=shared_pnr,
-                trip_type=models.TripType.ONE_WAY
-            )
-            db.add(booking)
-            db.flush()
-
-            # Save passenger details
-            bp = models.BookingPassenger(
-                booking_id=booking.booking_id,
-                full_name=p.full_name,
-                age=p.age,
-                gender=p.gender,
-                seat_no=seat_no
-            )
-            db.add(bp)
-            db.flush()
-
+        for p, seat_no in zip(passengers, seat_nos):
             bookings_created.append({
                 "passenger_name": p.full_name,
                 "seat_no": seat_no,
                 "fare_paid": float(price_per_passenger),
                 "total_fare": float(price_per_passenger),
                 "pnr": shared_pnr,
-                "booking_id": booking.booking_id
+                "booking_id": booking_ids[(flight.flight_id, seat_no)]
             })
 
-        # Update flight seat availability
-        flight.available_seats -= total_passengers
-        db.add(models.FareHistory(flight_id=flight.flight_id, price=price_per_passenger))
         db.commit()
+        cache.search_cache.invalidate_flights([flight.flight_id])
+        holds.reaper.add(shared_pnr, hold_expires_at)
+        fare_history.writer.record(flight.flight_id, price_per_passenger)
         
         return {
             "message": "One-way booking successful",
             "flight_id": flight.flight_id,
             "shared_pnr": shared_pnr,
             "total_passengers": total_passengers,
-            "primary_booking_id": booking.booking_id,
+            "primary_booking_id": bookings_created[0]["booking_id"],
+            "hold_expires_at": hold_expires_at,
             "bookings": bookings_created
         }
 
-    except Exception as e:
+    except HTTPException:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error creating booking: {e}")
-
-# -------------------------
-# Market Simulation
-# -------------------------
-async def simulate_market_step(interval_seconds: int = 30):
-    db = SessionLocal()
-    try:
-        flights = db.query(models.Flight).all()
-        for f in flights:
-            # simulate seat changes
-            if random.random() < 0.12 and f.available_seats > 0:
-                reduce_by = random.randint(1, min(3, f.available_seats))
-                f.available_seats -= reduce_by
-            elif random.random() < 0.04 and f.available_seats < f.total_seats:
-                inc = random.randint(1, min(2, f.total_seats - f.available_seats))
-                f.available_seats += inc
-
-            # compute dynamic price and record in FareHistory (do not store in Flight)
-            price = pricing.calculate_dynamic_price(
-                base_fare=f.base_fare,
-                available_seats=f.available_seats,
-                total_seats=f.total_seats,
-                departure=f.departure_time
-            )
-            db.add(models.FareHistory(flight_id=f.flight_id, price=price))
-
-        db.commit()
+        raise
+    except inventory.SeatUnavailable as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         db.rollback()
-        print("Market simulation error:", e)
-    finally:
-        db.close()
+        raise HTTPException(status_code=500, detail=f"Error creating booking: {e}")
@@ -0,0 +1,367 @@
+# market.py
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from sqlalchemy import select, update, bindparam, text
+from database import SessionLocal, engine
+import models, pricing, fare_history, cache, inventory
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# -------------------------
+# Configuration
+# -------------------------
+MARKET_INTERVAL_SECONDS = int(os.getenv("MARKET_INTERVAL_SECONDS", "30"))
+# flights per key-range shard; each shard is its own short transaction
+MARKET_SHARD_SIZE = int(os.getenv("MARKET_SHARD_SIZE", "1000"))
+# a tick stops after this long and the next tick resumes where it left off
+MARKET_TICK_BUDGET_SECONDS = float(os.getenv("MARKET_TICK_BUDGET_SECONDS", "20"))
+# set to 0 to keep this process out of leader election entirely
+MARKET_SIMULATOR_ENABLED = os.getenv("MARKET_SIMULATOR_ENABLED", "1") == "1"
+MARKET_LOCK_NAME = os.getenv("MARKET_LOCK_NAME", "flight_market_simulator")
+
+flights_t = models.Flight.__table__
+
+# last flight_id processed by an unfinished tick (0 = start from the beginning)
+_resume_after_id = 0
+
+_seat_update = (
+    update(flights_t)
+    .where(flights_t.c.flight_id == bindparam("b_flight_id"))
+    # apply the simulated change as a delta so concurrent bookings are not overwritten
+    .where((flights_t.c.available_seats + bindparam("b_delta")).between(0, flights_t.c.total_seats))
+    # counter only while the flight has no seat rows (see _move_seat_rows)
+    .where(flights_t.c.seat_map_version == 0)
+    .values(available_seats=flights_t.c.available_seats + bindparam("b_delta"), version=flights_t.c.version + 1)
+)
+
+_price_update = (
+    update(flights_t)
+    .where(flights_t.c.flight_id == bindparam("b_flight_id"))
+    .values(current_price=bindparam("b_price"), price_updated_at=bindparam("b_priced_at"))
+)
+
+
+def simulate_seat_changes(rng, available: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """
+    Random seat deltas for one shard: ~12% of flights sell 1-3 seats,
+    ~4% of the rest release 1-2 seats.
+    """
+    n = len(available)
+    sell = (rng.random(n) < 0.12) & (available > 0)
+    release = ~sell & (rng.random(n) < 0.04) & (available < total)
+
+    sold = rng.integers(1, np.maximum(1, np.minimum(3, available)), endpoint=True)
+    released = rng.integers(1, np.maximum(1, np.minimum(2, total - available)), endpoint=True)
+    return np.where(sell, -sold, np.where(release, released, 0))
+
+
+def _move_seat_rows(db, changes: dict, now) -> dict:
+    """
+    Apply simulated changes ({flight_id: delta}) to flights that have seat rows, in a
+    fixed number of statements: sales claim real seats for MARKET_PNR, releases free
+    only seats MARKET_PNR holds, so the counter and the seat map stay in step and no
+    booking's seat is ever given away. Returns {flight_id: change actually made}.
+    """
+    # locks the flight rows first, so no booking moves them before commit
+    flights = inventory.bump_seat_versions(db, list(changes))
+    versions = {fid: f.seat_map_version for fid, f in flights.items()}
+    sales = {fid: min(-d, flights[fid].available_seats) for fid, d in changes.items() if d < 0 and fid in flights}
+    releases = {fid: d for fid, d in changes.items() if d > 0 and fid in flights}
+
+    claimed = inventory.claim_market_seats(db, sales, versions, now)
+    freed = inventory.release_market_seats(db, releases, versions)
+    applied = {fid: -claimed.get(fid, 0) for fid in changes}
+    applied.update({fid: freed.get(fid, 0) for fid in releases})
+    # return_seats takes signed counts: one grouped counter UPDATE for the whole shard
+    inventory.return_seats(db, applied)
+    return applied
+
+
+def simulate_shard(db, ctx: pricing.PricingContext, after_id: int, shard_size: int):
+    """
+    Simulate demand and publish prices for the next `shard_size` future flights with
+    flight_id > after_id. Returns (last flight_id processed, row count); last id is None
+    when there is nothing left.
+    """
+    rows = db.execute(
+        select(
+            flights_t.c.flight_id,
+            flights_t.c.base_fare,
+            flights_t.c.available_seats,
+            flights_t.c.total_seats,
+            flights_t.c.departure_time,
+            flights_t.c.seat_map_version,
+        )
+        .where(flights_t.c.flight_id > after_id)
+        .where(flights_t.c.departure_time > ctx.now)
+        .order_by(flights_t.c.flight_id)
+        .limit(shard_size)
+    ).all()
+    if not rows:
+        return None, 0
+
+    flight_ids = np.array([r.flight_id for r in rows], dtype=np.int64)
+    available = np.array([r.available_seats or 0 for r in rows], dtype=np.int64)
+    total = np.array([r.total_seats or 0 for r in rows], dtype=np.int64)
+
+    delta = simulate_seat_changes(ctx.rng, available, total)
+
+    changed = np.nonzero(delta)[0]
+    counter_only = []
+    with_rows = {}
+    for i in changed.tolist():
+        if rows[i].seat_map_version:
+            with_rows[int(flight_ids[i])] = int(delta[i])
+        else:
+            counter_only.append({"b_flight_id": int(flight_ids[i]), "b_delta": int(delta[i])})
+    if with_rows:
+        applied = _move_seat_rows(db, with_rows, ctx.now)
+        for i in changed.tolist():
+            delta[i] = applied.get(int(flight_ids[i]), delta[i])
+    if counter_only:
+        # seat rows created later are seeded from available_seats (inventory.ensure_seat_rows)
+        db.execute(_seat_update, counter_only)
+
+    prices = pricing.calculate_dynamic_prices(
+        base_fares=[r.base_fare for r in rows],
+        available_seats=available + delta,
+        total_seats=total,
+        departures=[r.departure_time for r in rows],
+        flight_ids=flight_ids,
+        ctx=ctx,
+    )
+
+    db.execute(
+        _price_update,
+        [
+            {"b_flight_id": fid, "b_price": price, "b_priced_at": ctx.now}
+            for fid, price in zip(flight_ids.tolist(), prices.tolist())
+        ],
+    )
+    db.commit()
+    # new prices (and seats) published: drop cached search pages showing these flights
+    cache.search_cache.invalidate_flights(flight_ids.tolist())
+    # buffered; unchanged prices are dropped and the rest written as multi-row inserts
+    fare_history.writer.record_many(flight_ids.tolist(), prices.tolist(), ctx.now)
+    return int(flight_ids[-1]), len(rows)
+
+
+def simulate_market_step(shard_size: int = None, budget_seconds: float = None) -> dict:
+    """
+    Run one market tick over future flights in key-range shards.
+    Stops when the tick budget is spent; the next tick resumes after the last shard.
+    """
+    global _resume_after_id
+    shard_size = shard_size or MARKET_SHARD_SIZE
+    budget_seconds = budget_seconds or MARKET_TICK_BUDGET_SECONDS
+
+    # one clock snapshot + seeded RNG for the whole tick
+    ctx = pricing.PricingContext()
+    started = time.monotonic()
+    stats = {"flights": 0, "shards": 0, "complete": False}
+
+    db = SessionLocal()
+    try:
+        while True:
+            last_id, count = simulate_shard(db, ctx, _resume_after_id, shard_size)
+            if last_id is None or count < shard_size:
+                _resume_after_id = 0
+                stats["complete"] = True
+            else:
+                _resume_after_id = last_id
+            stats["flights"] += count
+            stats["shards"] += 1 if count else 0
+
+            if stats["complete"] or time.monotonic() - started >= budget_seconds:
+                break
+    except Exception as e:
+        db.rollback()
+        stats["error"] = str(e)
+        print("Market simulation error:", e)
+    finally:
+        db.close()
+        fare_history.writer.flush()
+
+    stats["duration"] = time.monotonic() - started
+    return stats
+
+
+# -------------------------
+# Leader election
+# -------------------------
+class LeaderLock:
+    """
+    Non-blocking cross-process lock so only one uvicorn worker runs the simulator.
+    MySQL uses a named lock (GET_LOCK) held on a dedicated connection; other
+    databases fall back to an exclusive lock file.
+    """
+
+    def __init__(self, name: str = MARKET_LOCK_NAME):
+        self.name = name
+        self._conn = None
+        self._file = None
+
+    def acquire(self) -> bool:
+        """
+        Try to become (or confirm we still are) the leader.
+        """
+        if engine.dialect.name == "mysql":
+            return self._acquire_mysql()
+        return self._acquire_file()
+
+    def _acquire_mysql(self) -> bool:
+        try:
+            if self._conn is None:
+                self._conn = engine.connect()
+                got = self._conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar()
+                self._conn.commit()
+                if got != 1:
+                    self.release()
+                    return False
+                return True
+            # the lock dies with its connection, so check we still own it
+            owner = self._conn.execute(
+                text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+            ).scalar()
+            self._conn.commit()
+            if owner != 1:
+                self.release()
+                return False
+            return True
+        except Exception as e:
+            print("Market leader lock error:", e)
+            self.release()
+            return False
+
+    def _acquire_file(self) -> bool:
+        if fcntl is None:
+            return True  # single-process platforms: always leader
+        if self._file is not None:
+            return True
+        f = open(os.path.join(tempfile.gettempdir(), f"{self.name}.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        if self._file is not None:
+            self._file.close()  # closing the file drops the flock
+            self._file = None
+
+
+# -------------------------
+# Background runner
+# -------------------------
+class MarketSimulator:
+    """
+    Runs market ticks on a dedicated thread so blocking DB work never touches the
+    event loop. Every worker starts one, but only the leader-lock holder simulates.
+    """
+
+    def __init__(self, interval_seconds: int = MARKET_INTERVAL_SECONDS, lock: LeaderLock = None):
+        self.interval_seconds = interval_seconds
+        self.lock = lock or LeaderLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_rollup = 0.0
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            "is_leader": False,
+            "ticks": 0,
+            "incomplete_ticks": 0,
+            "errors": 0,
+            "overruns": 0,  # ticks that took longer than the interval
+            "last_tick_at": None,
+            "last_tick_seconds": None,
+            "max_tick_seconds": 0.0,
+            "last_lag_seconds": None,  # how late the tick started vs. its schedule
+            "max_lag_seconds": 0.0,
+            "last_flights": 0,
+            "last_rollup": None,
+        }
+
+    def start(self):
+        if not MARKET_SIMULATOR_ENABLED or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.lock.release()
+        fare_history.writer.flush()
+
+    def snapshot(self) -> dict:
+        with self._metrics_lock:
+            return dict(self.metrics, interval_seconds=self.interval_seconds)
+
+    def _run(self):
+        scheduled = time.monotonic() + 1
+        while not self._stop.wait(max(0.0, scheduled - time.monotonic())):
+            is_leader = self.lock.acquire()
+            with self._metrics_lock:
+                self.metrics["is_leader"] = is_leader
+            if is_leader:
+                self._tick(lag=time.monotonic() - scheduled)
+                self._maybe_rollup()
+            else:
+                # fare points recorded by this worker's bookings still need writing
+                fare_history.writer.flush()
+
+            scheduled += self.interval_seconds
+            # don't try to catch up on missed ticks, just run the next one now
+            scheduled = max(scheduled, time.monotonic())
+
+    def _tick(self, lag: float):
+        stats = simulate_market_step()
+        with self._metrics_lock:
+            m = self.metrics
+            m["ticks"] += 1
+            m["last_tick_at"] = time.time()
+            m["last_tick_seconds"] = stats["duration"]
+            m["max_tick_seconds"] = max(m["max_tick_seconds"], stats["duration"])
+            m["last_lag_seconds"] = lag
+            m["max_lag_seconds"] = max(m["max_lag_seconds"], lag)
+            m["last_flights"] = stats["flights"]
+            if stats["duration"] > self.interval_seconds:
+                m["overruns"] += 1
+            if not stats["complete"]:
+                m["incomplete_ticks"] += 1
+            if "error" in stats:
+                m["errors"] += 1
+
+    def _maybe_rollup(self):
+        if time.monotonic() < self._next_rollup:
+            return
+        self._next_rollup = time.monotonic() + fare_history.FARE_ROLLUP_INTERVAL_SECONDS
+        try:
+            result = fare_history.rollup_fare_history()
+        except Exception as e:
+            print("Fare history rollup error:", e)
+            return
+        with self._metrics_lock:
+            self.metrics["last_rollup"] = result
+
+
+simulator = MarketSimulator()
@@ -1,6 +1,7 @@
 # models.py
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, DECIMAL, Enum, Date, Float, func, TIMESTAMP, UniqueConstraint
+    Column, Integer, String, DateTime, ForeignKey, DECIMAL, Enum, Date, Float, func, TIMESTAMP, UniqueConstraint,
+    Index, BigInteger
 )
 from sqlalchemy.orm import relationship
 from database import Base
@@ -23,7 +24,8 @@ class Airport(Base):
     __tablename__ = "airports"
     airport_id = Column(Integer, primary_key=True, autoincrement=True)
     airport_name = Column(String(100), nullable=False)
-    city = Column(String(50))
+    iata_code = Column(String(3), unique=True, nullable=True)
+    city = Column(String(50), index=True)
     country = Column(String(50))
 
 class Flight(Base):
@@ -41,6 +43,9 @@ class Flight(Base):
     flight_type = Column(Enum(FlightType), default=FlightType.DOMESTIC)
     travel_date = Column(Date)
     current_price = Column(Float, default=0)
+    price_updated_at = Column(DateTime, nullable=True)  # set by the market tick's price snapshot
+    seat_map_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on every seat claim/release
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped whenever available_seats changes
 
     # ✅ Relationships
     airline = relationship("Airline", back_populates="flights")
@@ -59,6 +64,15 @@ class Flight(Base):
     )
     fare_history = relationship("FareHistory", back_populates="flight")
 
+    __table_args__ = (
+        # route search: source + destination equality, then departure_time range
+        Index("ix_flights_route_departure", "source_airport", "destination_airport", "departure_time"),
+        # destination-only searches
+        Index("ix_flights_destination_departure", "destination_airport", "departure_time"),
+        # date-only searches and the market simulator's future-flights filter
+        Index("ix_flights_departure_time", "departure_time"),
+    )
+
 class Passenger(Base):
     __tablename__ = "passengers"
     passenger_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -99,12 +113,13 @@ class Booking(Base):
     total_fare = Column(DECIMAL(10, 2), nullable=True)
     booking_date = Column(DateTime, server_default=func.now())
     status = Column(String(20), default="PENDING_PAYMENT")  # e.g., PENDING_PAYMENT, CONFIRMED, CANCELLED
-    pnr = Column(String(12), unique=True, nullable=True)
+    pnr = Column(String(12), index=True, nullable=True)  # shared by every passenger and leg of one booking
 
     # ✅ New columns for round trip
     trip_type = Column(SQLAlchemyEnum(TripType), default=TripType.ONE_WAY)
     return_flight_id = Column(Integer, ForeignKey("flights.flight_id"), nullable=True)
     is_return_leg = Column(Boolean, default=False)
+    hold_expires_at = Column(DateTime, nullable=True, index=True)  # PENDING_PAYMENT seats are released after this
 
 
     flight = relationship(
@@ -121,6 +136,48 @@ class Booking(Base):
     booking_passengers = relationship("BookingPassenger", back_populates="booking", cascade="all, delete-orphan")
 
 
+class FlightSeat(Base):
+    """
+    One row per physical seat; pnr is set while a booking holds the seat.
+    """
+    __tablename__ = "flight_seats"
+    flight_id = Column(Integer, ForeignKey("flights.flight_id"), primary_key=True)
+    seat_no = Column(String(5), primary_key=True)  # e.g. "12A"
+    seat_index = Column(Integer, nullable=False)  # row-major position in the cabin layout
+    pnr = Column(String(12), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, default=0)  # flight's seat_map_version when this seat last changed
+
+    __table_args__ = (
+        # free-seat scans in layout order
+        Index("ix_flight_seats_flight_index", "flight_id", "seat_index"),
+        # releasing a booking's seats
+        Index("ix_flight_seats_flight_pnr", "flight_id", "pnr"),
+        # seat map deltas since a version
+        Index("ix_flight_seats_flight_version", "flight_id", "version"),
+    )
+
+
+class PnrSequence(Base):
+    """
+    Next unreserved PNR sequence number; workers take blocks of it (see pnr_allocator.py).
+    """
+    __tablename__ = "pnr_sequence"
+    name = Column(String(32), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)
+
+
+class RevokedToken(Base):
+    """
+    Access tokens logged out before they expire; every worker polls new rows into memory
+    (see auth.TokenStore). Rows are deleted once the token would have expired anyway.
+    """
+    __tablename__ = "revoked_tokens"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(32), nullable=False, unique=True)
+    expires_at = Column(BigInteger, nullable=False, index=True)  # epoch seconds, the token's exp claim
+
+
 class FareHistory(Base):
     __tablename__ = "fare_history"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -130,3 +187,28 @@ class FareHistory(Base):
 
     flight = relationship("Flight", back_populates="fare_history")
 
+    __table_args__ = (
+        Index("ix_fare_history_flight_recorded", "flight_id", "recorded_at"),
+    )
+
+
+class FareHistoryRollup(Base):
+    """
+    Downsampled fare history: one row per flight per hour (or day) bucket.
+    """
+    __tablename__ = "fare_history_rollup"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    flight_id = Column(Integer, ForeignKey("flights.flight_id"), nullable=False)
+    granularity = Column(String(4), nullable=False)  # HOUR or DAY
+    bucket_start = Column(DateTime, nullable=False)
+    open_price = Column(DECIMAL(12,2))
+    close_price = Column(DECIMAL(12,2))
+    min_price = Column(DECIMAL(12,2))
+    max_price = Column(DECIMAL(12,2))
+    avg_price = Column(DECIMAL(12,2))
+    samples = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("flight_id", "granularity", "bucket_start", name="uq_fare_rollup_bucket"),
+    )
+
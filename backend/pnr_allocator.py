@@ -0,0 +1,139 @@
+# pnr_allocator.py
+import os
+import threading
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from database import engine
+import models
+
+# -------------------------
+# Configuration
+# -------------------------
+# sequence numbers a worker reserves per database round trip
+PNR_BLOCK_SIZE = int(os.getenv("PNR_BLOCK_SIZE", "1000"))
+# scrambles sequence numbers into PNRs; keep it fixed once bookings exist
+PNR_SECRET = int(os.getenv("PNR_SECRET", "0x5A17C3E9B"), 0)
+PNR_SEQUENCE_NAME = "pnr"
+PNR_BLOCK_ATTEMPTS = 10
+
+# Crockford base-32: no I, L, O or U, so PNRs read back over the phone unambiguously
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+PNR_BODY_LENGTH = 7  # 7 symbols = 35 bits = ~34 billion PNRs, plus one check symbol
+_BITS = 5 * PNR_BODY_LENGTH
+_MASK = (1 << _BITS) - 1
+
+sequence_t = models.PnrSequence.__table__
+
+
+class PnrSpaceExhausted(Exception):
+    """
+    Every sequence number the PNR encoding can represent has been handed out.
+    """
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def _scramble(n: int) -> int:
+    """
+    Bijection on 35-bit integers (xor, odd multiply, xorshift), so consecutive
+    sequence numbers give unrelated-looking PNRs and distinct numbers never collide.
+    """
+    x = (n ^ PNR_SECRET) & _MASK
+    x = (x * 0x2C1B3C6D5) & _MASK
+    x ^= x >> 17
+    x = (x * 0x297A2D39B) & _MASK
+    x ^= x >> 16
+    return x
+
+
+def check_symbol(body: str) -> str:
+    """
+    Luhn mod 32 check symbol: catches any single mistyped symbol and most swaps.
+    """
+    total, factor = 0, 2
+    for ch in reversed(body):
+        addend = factor * ALPHABET.index(ch)
+        total += addend // 32 + addend % 32
+        factor = 3 - factor
+    return ALPHABET[-total % 32]
+
+
+def encode_pnr(n: int) -> str:
+    x = _scramble(n)
+    body = "".join(ALPHABET[(x >> (5 * i)) & 31] for i in reversed(range(PNR_BODY_LENGTH)))
+    return body + check_symbol(body)
+
+
+def is_valid_pnr(pnr: str) -> bool:
+    """
+    True for well-formed allocator PNRs (older random PNRs don't carry a check symbol).
+    """
+    pnr = (pnr or "").upper()
+    if len(pnr) != PNR_BODY_LENGTH + 1 or any(ch not in ALPHABET for ch in pnr):
+        return False
+    return check_symbol(pnr[:-1]) == pnr[-1]
+
+
+# -------------------------
+# Block allocation
+# -------------------------
+def reserve_block(size: int = PNR_BLOCK_SIZE) -> range:
+    """
+    Reserve `size` sequence numbers with a compare-and-set UPDATE on the sequence
+    row, in its own short transaction (never rolled back with a failed booking).
+    """
+    for _ in range(PNR_BLOCK_ATTEMPTS):
+        with engine.begin() as conn:
+            start = conn.execute(
+                select(sequence_t.c.next_value).where(sequence_t.c.name == PNR_SEQUENCE_NAME)
+            ).scalar()
+            if start is None:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(sequence_t).values(name=PNR_SEQUENCE_NAME, next_value=0))
+                except IntegrityError:
+                    pass  # another worker created it first
+                continue
+            if start + size > _MASK + 1:
+                raise PnrSpaceExhausted()
+            claimed = conn.execute(
+                update(sequence_t)
+                .where(sequence_t.c.name == PNR_SEQUENCE_NAME)
+                .where(sequence_t.c.next_value == start)
+                .values(next_value=start + size)
+            ).rowcount
+        if claimed == 1:
+            return range(start, start + size)
+    raise RuntimeError("Could not reserve a PNR block")
+
+
+class PnrAllocator:
+    """
+    Hands out PNRs from a block of sequence numbers reserved by this worker, so
+    uniqueness needs no lookups: one UPDATE per PNR_BLOCK_SIZE bookings.
+    Numbers left in a block when the process exits are simply never used.
+    """
+
+    def __init__(self, block_size: int = PNR_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._block = iter(())
+        self.metrics = {"issued": 0, "blocks": 0}
+
+    def next(self) -> str:
+        with self._lock:
+            n = next(self._block, None)
+            if n is None:
+                self._block = iter(reserve_block(self.block_size))
+                self.metrics["blocks"] += 1
+                n = next(self._block)
+            self.metrics["issued"] += 1
+        return encode_pnr(n)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, block_size=self.block_size)
+
+
+allocator = PnrAllocator()
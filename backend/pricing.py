@@ -1,6 +1,95 @@
 # pricing.py
-from datetime import datetime
-import random
+from datetime import datetime, timedelta
+import os
+import numpy as np
+
+# Seed shared by all workers so the same flight jitters the same everywhere
+PRICING_SEED = int(os.getenv("PRICING_SEED", "0"))
+# Jitter is stable for a flight within one bucket of this many seconds
+PRICE_BUCKET_SECONDS = int(os.getenv("PRICE_BUCKET_SECONDS", "300"))
+# Read paths serve the market tick's price snapshot (Flight.current_price) while it is
+# younger than this; ticks run every 30s, so the default tolerates two missed ticks.
+PRICE_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE_SECONDS", "90"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class PricingContext:
+    """
+    One clock snapshot and seeded RNG for a single request or market tick.
+
+    Every flight priced through the same context sees the same `now`, and its
+    jitter is keyed by (flight_id, time bucket), so a flight prices the same
+    within a bucket no matter how often it is re-priced.
+    """
+
+    def __init__(self, now: datetime = None, seed: int = None, bucket_seconds: int = None):
+        self.now = now or datetime.utcnow()
+        self.seed = PRICING_SEED if seed is None else seed
+        self.bucket_seconds = bucket_seconds or PRICE_BUCKET_SECONDS
+        epoch_us = int((self.now - _EPOCH).total_seconds() * 1_000_000)
+        self.bucket = epoch_us // (self.bucket_seconds * 1_000_000)
+        # general-purpose RNG (e.g. simulated demand), reproducible for a given seed + clock
+        self.rng = np.random.default_rng([self.seed, epoch_us])
+
+    def jitter(self, flight_ids) -> np.ndarray:
+        """
+        Deterministic jitter in [0.97, 1.06) per flight for the current bucket.
+        """
+        ids = np.asarray(flight_ids, dtype=np.uint64)
+        key = np.uint64(((self.bucket & 0xFFFFFFFF) << 32) ^ (self.seed & 0xFFFFFFFF))
+        with np.errstate(over="ignore"):
+            x = ids * np.uint64(0x9E3779B97F4A7C15) ^ key
+            # splitmix64 finalizer
+            x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            x = x ^ (x >> np.uint64(31))
+        unit = (x >> np.uint64(11)).astype(float) * (1.0 / (1 << 53))  # 0..1
+        return 0.97 + 0.09 * unit
+
+
+def calculate_dynamic_prices(
+    base_fares,
+    available_seats,
+    total_seats,
+    departures,
+    demand_index=1.0,
+    tier_multiplier=1.0,
+    flight_ids=None,
+    ctx: PricingContext = None,
+) -> np.ndarray:
+    """
+    Vectorized version of calculate_dynamic_price.
+    Takes equal-length sequences (or scalars for demand_index / tier_multiplier)
+    and returns a float64 array of prices rounded to 2 decimals, computed in one pass.
+    Pass flight_ids to get per-flight jitter that is stable within the context's time bucket.
+    """
+    ctx = ctx or PricingContext()
+
+    base = np.nan_to_num(np.asarray(base_fares, dtype=float))
+
+    total = np.maximum(1.0, np.floor(np.nan_to_num(np.asarray(total_seats, dtype=float), nan=1.0)))
+    available = np.maximum(0.0, np.floor(np.nan_to_num(np.asarray(available_seats, dtype=float))))
+
+    sold_ratio = (total - available) / total  # 0..1
+    seat_factor = 1.0 + 0.6 * sold_ratio  # up to +60%
+
+    deps = np.asarray(departures, dtype="datetime64[us]")
+    days = (deps - np.datetime64(ctx.now, "us")) / np.timedelta64(1, "D")
+    # closer -> higher multiplier; cap it
+    time_factor = np.minimum(1.0 + (30.0 / np.maximum(1.0, days)) * 0.05, 1.6)
+    time_factor = np.where(days <= 0, 1.5, time_factor)
+
+    demand_factor = np.clip(np.asarray(demand_index, dtype=float), 0.5, 2.0)  # clamp
+
+    if flight_ids is not None:
+        jitter = ctx.jitter(flight_ids)
+    else:
+        jitter = ctx.rng.uniform(0.97, 1.06, size=base.shape)
+
+    price = base * seat_factor * time_factor * demand_factor * np.asarray(tier_multiplier, dtype=float) * jitter
+    return np.round(price, 2)
+
 
 def calculate_dynamic_price(
     base_fare: float,
@@ -8,7 +97,9 @@ def calculate_dynamic_price(
     total_seats: int,
     departure: datetime,
     demand_index: float = 1.0,
-    tier_multiplier: float = 1.0
+    tier_multiplier: float = 1.0,
+    flight_id: int = None,
+    ctx: PricingContext = None,
 ) -> float:
     """
     Compose price using:
@@ -16,31 +107,53 @@ def calculate_dynamic_price(
     - time to departure: gets more expensive as departure approaches
     - demand index: external demand multiplier
     - tier_multiplier: reserved for airline tier (1.0 default)
+
+    Thin wrapper around calculate_dynamic_prices for a single flight.
     """
     try:
         base = float(base_fare)
     except Exception:
         base = float(base_fare or 0.0)
 
-    total_seats = max(1, int(total_seats or 1))
-    available_seats = max(0, int(available_seats or 0))
+    prices = calculate_dynamic_prices(
+        [base],
+        [available_seats or 0],
+        [total_seats or 1],
+        [departure],
+        demand_index=demand_index,
+        tier_multiplier=tier_multiplier,
+        flight_ids=None if flight_id is None else [flight_id],
+        ctx=ctx,
+    )
+    return float(prices[0])
 
-    sold_ratio = (total_seats - available_seats) / total_seats  # 0..1
-    seat_factor = 1.0 + 0.6 * sold_ratio  # up to +60%
 
-    now = datetime.utcnow()
-    secs = (departure - now).total_seconds()
-    days = secs / (3600 * 24)
-    if days <= 0:
-        time_factor = 1.5
-    else:
-        # closer -> higher multiplier; cap it
-        time_factor = 1.0 + max(0, (30.0 / max(1.0, days))) * 0.05
-        time_factor = min(time_factor, 1.6)
-
-    demand_factor = max(0.5, min(2.0, demand_index))  # clamp
+def snapshot_prices(rows, ctx: PricingContext = None) -> list:
+    """
+    Prices for flight rows (records.FlightView, or anything carrying flight_id, base_fare,
+    available_seats, total_seats, departure_time, current_price and price_updated_at).
+    Serves the market snapshot where it is fresh and batch-prices only the stale rows.
+    """
+    ctx = ctx or PricingContext()
+    cutoff = ctx.now - timedelta(seconds=PRICE_SNAPSHOT_MAX_AGE_SECONDS)
 
-    jitter = random.uniform(0.97, 1.06)
+    prices = [None] * len(rows)
+    stale = []
+    for i, r in enumerate(rows):
+        if r.price_updated_at is not None and r.price_updated_at >= cutoff:
+            prices[i] = float(r.current_price)
+        else:
+            stale.append(i)
 
-    price = base * seat_factor * time_factor * demand_factor * tier_multiplier * jitter
-    return round(price, 2)
+    if stale:
+        fresh = calculate_dynamic_prices(
+            base_fares=[rows[i].base_fare for i in stale],
+            available_seats=[rows[i].available_seats for i in stale],
+            total_seats=[rows[i].total_seats for i in stale],
+            departures=[rows[i].departure_time for i in stale],
+            flight_ids=[rows[i].flight_id for i in stale],
+            ctx=ctx,
+        ).tolist()
+        for i, price in zip(stale, fresh):
+            prices[i] = price
+    return prices
@@ -0,0 +1,61 @@
+# records.py
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import select
+import models
+
+
+class FlightView(NamedTuple):
+    """
+    Read-only flight row shared by the read endpoints, pricing and serializers.
+    A plain tuple: no per-row dict or ORM identity/state, fares already floats.
+    """
+    flight_id: int
+    flight_number: str
+    departure_time: datetime
+    arrival_time: datetime
+    available_seats: int
+    total_seats: int
+    base_fare: float
+    current_price: Optional[float]
+    price_updated_at: Optional[datetime]
+    airline_id: Optional[int]
+    source_airport: Optional[int]
+    destination_airport: Optional[int]
+
+
+FLIGHT_VIEW_COLUMNS = tuple(getattr(models.Flight, name) for name in FlightView._fields)
+_WIDTH = len(FlightView._fields)
+
+
+def select_flight_views(*extra_columns):
+    """
+    SELECT of the FlightView columns (in field order), plus any extra columns after them.
+    """
+    return select(*FLIGHT_VIEW_COLUMNS, *extra_columns)
+
+
+def flight_view(row) -> FlightView:
+    """
+    FlightView from a result row of select_flight_views (extra columns are dropped).
+    """
+    (flight_id, flight_number, departure_time, arrival_time, available_seats, total_seats,
+     base_fare, current_price, price_updated_at, airline_id, source_airport, destination_airport) = row[:_WIDTH]
+    return FlightView(
+        flight_id,
+        flight_number,
+        departure_time,
+        arrival_time,
+        available_seats,
+        total_seats,
+        float(base_fare),
+        float(current_price) if current_price is not None else None,
+        price_updated_at,
+        airline_id,
+        source_airport,
+        destination_airport,
+    )
+
+
+def flight_views(rows) -> list:
+    return [flight_view(r) for r in rows]
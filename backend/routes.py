@@ -0,0 +1,186 @@
+# routes.py
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from database import SessionLocal
+import models, pricing, records
+
+# -------------------------
+# Configuration
+# -------------------------
+# the schedule changes rarely; seats and prices are re-read for every search
+ROUTE_GRAPH_TTL_SECONDS = int(os.getenv("ROUTE_GRAPH_TTL_SECONDS", "300"))
+# how far ahead departures are loaded into the graph
+ROUTE_GRAPH_HORIZON_DAYS = int(os.getenv("ROUTE_GRAPH_HORIZON_DAYS", "90"))
+LAYOVER_MIN_MINUTES = int(os.getenv("LAYOVER_MIN_MINUTES", "45"))
+LAYOVER_MAX_MINUTES = int(os.getenv("LAYOVER_MAX_MINUTES", "720"))
+MAX_STOPS = 2
+# itineraries enumerated per search before pricing (shortest trips are kept)
+CONNECTION_MAX_CANDIDATES = int(os.getenv("CONNECTION_MAX_CANDIDATES", "500"))
+
+
+class RouteGraph:
+    """
+    Future flights grouped by departure airport, each list sorted by departure
+    time, so "flights out of X leaving between t1 and t2" is two bisects.
+    Built from FlightView rows; rebuilt when older than ROUTE_GRAPH_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl_seconds: int = ROUTE_GRAPH_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._expires_at = 0.0
+        # airport_id -> ([departure_time], [FlightView]) in departure order; swapped whole on rebuild
+        self._by_airport = {}
+        self._arrivals_into = {}  # airport_id -> {airports with a flight into it}
+        self.metrics = {"builds": 0, "flights": 0, "airports": 0, "searches": 0, "last_build_seconds": None}
+
+    def load(self):
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                records.select_flight_views()
+                .where(models.Flight.departure_time > now)
+                .where(models.Flight.departure_time < now + timedelta(days=ROUTE_GRAPH_HORIZON_DAYS))
+                .order_by(models.Flight.departure_time, models.Flight.flight_id)
+            ).all()
+        finally:
+            db.close()
+
+        flights = defaultdict(list)
+        arrivals_into = defaultdict(set)
+        for f in records.flight_views(rows):
+            if f.source_airport is None or f.destination_airport is None or f.arrival_time <= f.departure_time:
+                continue
+            flights[f.source_airport].append(f)  # already in departure order
+            arrivals_into[f.destination_airport].add(f.source_airport)
+
+        with self._lock:
+            self._by_airport = {a: ([f.departure_time for f in fl], fl) for a, fl in flights.items()}
+            self._arrivals_into = dict(arrivals_into)
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            self.metrics.update(
+                builds=self.metrics["builds"] + 1,
+                flights=sum(len(fl) for fl in flights.values()),
+                airports=len(flights),
+                last_build_seconds=round(time.perf_counter() - started, 4),
+            )
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+    def ensure_fresh(self):
+        if time.monotonic() >= self._expires_at:
+            self.load()
+        return self
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, ttl_seconds=self.ttl_seconds)
+
+    def departures_between(self, airport_id, start: datetime, end: datetime, by_airport: dict = None) -> list:
+        """
+        Flights leaving `airport_id` in [start, end), in departure order.
+        """
+        entry = (by_airport if by_airport is not None else self._by_airport).get(airport_id)
+        if not entry:
+            return []
+        times, flights = entry
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_left(times, end, lo)
+        return flights[lo:hi]
+
+    def _reaches(self, destinations, max_legs: int) -> list:
+        """
+        reach[k] = airports from which a destination is reachable in at most k legs
+        (schedule-agnostic, used to prune the time-dependent search).
+        """
+        reach = [set(destinations)]
+        for _ in range(max_legs):
+            prev = reach[-1]
+            reach.append(prev | {src for a in prev for src in self._arrivals_into.get(a, ())})
+        return reach
+
+    def connections(self, origins, destinations, window_start: datetime, window_end: datetime,
+                    max_stops: int = MAX_STOPS, min_layover: timedelta = None, max_layover: timedelta = None,
+                    max_candidates: int = CONNECTION_MAX_CANDIDATES) -> list:
+        """
+        Itineraries (tuples of FlightView) from any of `origins` to any of `destinations`
+        whose first leg departs in [window_start, window_end), with up to `max_stops`
+        stops and every layover within [min_layover, max_layover].
+        Legs are expanded in departure-time order, only from airports that can still
+        reach a destination with the legs left; no airport is visited twice.
+        """
+        min_layover = min_layover if min_layover is not None else timedelta(minutes=LAYOVER_MIN_MINUTES)
+        max_layover = max_layover if max_layover is not None else timedelta(minutes=LAYOVER_MAX_MINUTES)
+        destinations = set(destinations)
+        max_legs = max_stops + 1
+        with self._lock:
+            self.metrics["searches"] += 1
+        by_airport = self._by_airport  # one consistent snapshot even if a rebuild lands mid-search
+        reach = self._reaches(destinations, max_legs)
+
+        found = []
+        # (itinerary so far, airports visited); the frontier grows one leg per round
+        frontier = [
+            ((f,), {a, f.destination_airport})
+            for a in set(origins)
+            for f in self.departures_between(a, window_start, window_end, by_airport)
+            if f.destination_airport in reach[max_legs - 1]
+        ]
+        for legs_used in range(1, max_legs + 1):
+            legs_left = max_legs - legs_used
+            next_frontier = []
+            for path, visited in frontier:
+                last = path[-1]
+                here = last.destination_airport
+                if here in destinations:
+                    found.append(path)
+                    continue
+                if legs_left == 0 or here not in reach[legs_left]:
+                    continue
+                earliest, latest = last.arrival_time + min_layover, last.arrival_time + max_layover
+                for f in self.departures_between(here, earliest, latest, by_airport):
+                    if f.destination_airport in visited or f.destination_airport not in reach[legs_left - 1]:
+                        continue
+                    next_frontier.append((path + (f,), visited | {f.destination_airport}))
+            frontier = next_frontier
+            if len(found) >= max_candidates * 4:
+                break  # plenty to rank from
+
+        found.sort(key=lambda p: (p[-1].arrival_time - p[0].departure_time, len(p)))
+        return found[:max_candidates]
+
+
+def price_itineraries(db, itineraries: list, passengers: int, ctx: pricing.PricingContext = None) -> list:
+    """
+    Re-read every flight used by `itineraries` in one query (seats and prices move far
+    faster than the schedule), batch-price them, and drop itineraries with a leg that
+    can't seat `passengers` any more. Returns [(legs as fresh FlightViews, leg prices)].
+    """
+    flight_ids = sorted({f.flight_id for path in itineraries for f in path})
+    if not flight_ids:
+        return []
+    rows = db.execute(
+        records.select_flight_views().where(models.Flight.flight_id.in_(flight_ids))
+    ).all()
+    fresh = {f.flight_id: f for f in records.flight_views(rows)}
+    views = [fresh[fid] for fid in flight_ids if fid in fresh]
+    prices = dict(zip((f.flight_id for f in views), pricing.snapshot_prices(views, ctx)))
+
+    priced = []
+    for path in itineraries:
+        legs = [fresh.get(f.flight_id) for f in path]
+        if any(f is None or (f.available_seats or 0) < passengers for f in legs):
+            continue
+        priced.append((legs, [prices[f.flight_id] for f in legs]))
+    return priced
+
+
+route_graph = RouteGraph()
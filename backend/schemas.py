@@ -122,5 +122,25 @@ class PriceResponse(BaseModel):
     dynamic_price: float
     base_fare: float
     available_seats: int
+    priced_at: Optional[datetime] = None
     class Config: orm_mode = True
 
+# Fare history
+class FareBucketOut(BaseModel):
+    flight_id: int
+    bucket_start: datetime
+    granularity: str
+    open: float
+    high: float
+    low: float
+    close: float
+    avg: float
+    samples: int
+
+class FareHistoryPage(BaseModel):
+    bucket: str
+    start: datetime
+    end: datetime
+    items: List[FareBucketOut]
+    next_cursor: Optional[str] = None
+
@@ -0,0 +1,94 @@
+# serializers.py
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi import Response
+from records import FlightView
+
+try:
+    import orjson
+except ImportError:  # stdlib encoder, same output, slower
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(Response):
+    """
+    JSON straight from trusted dicts, skipping response_model validation
+    (endpoints that return it directly keep their response_model for the docs only).
+    Pre-encoded bytes are sent as they are.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+# -------------------------
+# Flights
+# -------------------------
+def flight_out(f: FlightView, dynamic_price: float, refs) -> dict:
+    """
+    One flight (see FlightOut) with names resolved through the reference cache;
+    keys and order match what FlightOut validation used to emit.
+    """
+    return {
+        "flight_id": f.flight_id,
+        "flight_number": f.flight_number,
+        "airline_id": None,
+        "airline_name": refs.airline_name(f.airline_id),
+        "source_airport": refs.airport_city(f.source_airport),
+        "destination_airport": refs.airport_city(f.destination_airport),
+        "departure_time": f.departure_time,
+        "arrival_time": f.arrival_time,
+        "base_fare": f.base_fare,
+        "total_seats": f.total_seats,
+        "available_seats": f.available_seats,
+        "flight_type": None,
+        "travel_date": None,
+        "dynamic_price": dynamic_price,
+    }
+
+
+def flights_response(flights, prices, refs, response: Response = None) -> FastJSONResponse:
+    """
+    Encode a listing page, carrying over headers (e.g. the next-page cursor)
+    set on the endpoint's `response` parameter.
+    """
+    body = dumps([flight_out(f, p, refs) for f, p in zip(flights, prices)])
+    return FastJSONResponse(body, headers=dict(response.headers) if response is not None else None)
+
+
+def itinerary_out(legs: list, prices: list, passengers: int, refs) -> dict:
+    """
+    A connection-search result: its legs as flight_out rows plus trip totals.
+    """
+    layovers = [
+        int((nxt.departure_time - prev.arrival_time).total_seconds() // 60)
+        for prev, nxt in zip(legs, legs[1:])
+    ]
+    fare = round(sum(prices), 2)
+    return {
+        "stops": len(legs) - 1,
+        "departure_time": legs[0].departure_time,
+        "arrival_time": legs[-1].arrival_time,
+        "duration_minutes": int((legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60),
+        "layover_minutes": layovers,
+        "fare_per_passenger": fare,
+        "total_fare": round(fare * passengers, 2),
+        "legs": [flight_out(f, p, refs) for f, p in zip(legs, prices)],
+    }
@@ -0,0 +1,125 @@
+# tests/conftest.py
+# Runs the API against a throwaway SQLite file instead of MySQL. The engines are
+# swapped before any app module is imported, since modules bind them at import time.
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MARKET_SIMULATOR_ENABLED", "0")
+os.environ.setdefault("AUTH_SECRET", "test-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+import database
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="flightsim-tests-"), "test.db")
+database.engine = create_engine(
+    f"sqlite:///{DB_PATH}",
+    connect_args={"check_same_thread": False, "timeout": 30},
+    **database._pool_options(database.InstrumentedQueuePool),
+)
+database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+database.async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{DB_PATH}", **database._pool_options(database.InstrumentedAsyncQueuePool)
+)
+database.AsyncSessionLocal = async_sessionmaker(database.async_engine, autoflush=False, expire_on_commit=False)
+
+import models, cache, routes, auth  # noqa: E402  (after the engine swap)
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+AIRPORTS = ["Delhi", "Mumbai", "Bangalore", "Kolkata"]
+
+
+def seed(db, days: int = 3, total_seats: int = 150, available_seats: int = 120):
+    """
+    Two airlines, four airports and one flight per ordered airport pair per day.
+    """
+    db.add_all([models.Airline(airline_name="Air India", iata_code="AI"), models.Airline(airline_name="IndiGo", iata_code="6E")])
+    for city in AIRPORTS:
+        db.add(models.Airport(airport_name=f"{city} Intl", iata_code=city[:3].upper(), city=city, country="India"))
+    db.add(models.Passenger(full_name="Owner", email="owner@example.com", hashed_password="x"))
+    db.add(models.Passenger(full_name="Other", email="other@example.com", hashed_password="x"))
+    db.commit()
+
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    n = 0
+    for day in range(1, days + 1):
+        for src in range(1, len(AIRPORTS) + 1):
+            for dst in range(1, len(AIRPORTS) + 1):
+                if src == dst:
+                    continue
+                n += 1
+                dep = now + timedelta(days=day, hours=(src * 3 + dst) % 12)
+                db.add(models.Flight(
+                    airline_id=1 + n % 2, flight_number=f"F{n}", source_airport=src, destination_airport=dst,
+                    departure_time=dep, arrival_time=dep + timedelta(hours=2), base_fare=4000 + n * 10,
+                    total_seats=total_seats, available_seats=available_seats,
+                ))
+    db.commit()
+
+
+@pytest.fixture
+def db():
+    """
+    Fresh schema and seed data for every test.
+    """
+    database.Base.metadata.drop_all(database.engine)
+    database.Base.metadata.create_all(database.engine)
+    session = database.SessionLocal()
+    seed(session)
+    cache.reference_cache.invalidate()
+    cache.search_cache.clear()
+    cache.seat_map_cache = cache.SeatMapCache()  # keyed by seat_map_version, which restarts at 0
+    routes.route_graph.invalidate()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    # no `with`: the lifespan (simulator, reaper, hashing pool) stays off
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(passenger_id: int = 1) -> dict:
+        return {"Authorization": f"Bearer {auth.tokens.issue(passenger_id)['access_token']}"}
+    return headers
+
+
+@contextmanager
+def _count_queries(bind=None):
+    bind = bind if bind is not None else database.engine
+    bind = getattr(bind, "sync_engine", bind)  # AsyncEngine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Record every statement executed on an engine (default: the sync engine) inside
+    the block, to assert an endpoint runs a fixed number of queries:
+
+        with count_queries() as statements:
+            client.post(f"/bookings/{pnr}/cancel", headers=auth_headers(1))
+        assert len(statements) == 6, statements
+    """
+    return _count_queries
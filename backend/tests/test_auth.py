@@ -0,0 +1,18 @@
+# tests/test_auth.py
+import pytest
+import auth
+
+
+def test_logout_reaches_every_worker(db, client):
+    other_worker = auth.TokenStore()
+    issued = auth.tokens.issue(1)
+    token = issued["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    other_worker.verify(token)  # cached as valid before the logout
+
+    assert client.post("/passengers/logout", headers=headers).status_code == 200
+    assert client.post("/passengers/logout", headers=headers).status_code == 401
+
+    other_worker.poll_revocations(force=True)
+    with pytest.raises(auth.InvalidToken):
+        other_worker.verify(token)
@@ -0,0 +1,119 @@
+# tests/test_bookings.py
+from datetime import datetime, timedelta
+import pytest
+import database, holds, main, models
+
+
+def book_roundtrip(client, headers, onward_id: int, return_id: int, passengers: int = 2) -> dict:
+    resp = client.post("/bookings/roundtrip", headers=headers(1), json={
+        "owner_passenger_id": 1,
+        "onward_flight_id": onward_id,
+        "return_flight_id": return_id,
+        "passengers": [{"full_name": f"P{i}"} for i in range(passengers)],
+    })
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def same_airline_pair(db):
+    onward, ret = db.get(models.Flight, 1), db.get(models.Flight, 16)
+    ret.airline_id = onward.airline_id
+    db.commit()
+    return onward.flight_id, ret.flight_id
+
+
+def seats_left(db, flight_id: int) -> int:
+    db.expire_all()
+    return db.get(models.Flight, flight_id).available_seats
+
+
+def leg_statuses(db, pnr: str) -> dict:
+    db.expire_all()
+    rows = db.query(models.Booking).filter(models.Booking.pnr == pnr).all()
+    return {leg: {b.status for b in rows if b.is_return_leg == leg} for leg in (False, True)}
+
+
+def test_unpaid_onward_legs_stay_payable_after_return_cancel(db, client, auth_headers, monkeypatch):
+    onward_id, return_id = same_airline_pair(db)
+    pnr = book_roundtrip(client, auth_headers, onward_id, return_id)["onward_pnr"]
+
+    resp = client.post(f"/bookings/{pnr}/cancel", params={"leg": "return"}, headers=auth_headers(1))
+    assert resp.status_code == 200 and resp.json()["cancelled_count"] == 2
+    assert leg_statuses(db, pnr) == {False: {"PENDING_PAYMENT"}, True: {"CANCELLED"}}
+    assert seats_left(db, return_id) == 120
+
+    monkeypatch.setattr(main.random, "random", lambda: 0.0)
+    resp = client.post(f"/bookings/{pnr}/pay", headers=auth_headers(1))
+    assert resp.status_code == 200 and resp.json()["status"] == "CONFIRMED"
+    assert leg_statuses(db, pnr) == {False: {"CONFIRMED"}, True: {"CANCELLED"}}
+
+
+def test_unpaid_onward_legs_are_reaped_after_return_cancel(db, client, auth_headers):
+    onward_id, return_id = same_airline_pair(db)
+    pnr = book_roundtrip(client, auth_headers, onward_id, return_id)["onward_pnr"]
+    client.post(f"/bookings/{pnr}/cancel", params={"leg": "return"}, headers=auth_headers(1))
+    assert seats_left(db, onward_id) == 118
+
+    holds.reaper.sweep()
+    holds.reaper.reap(datetime.utcnow() + timedelta(days=1))
+    assert leg_statuses(db, pnr) == {False: {"EXPIRED"}, True: {"CANCELLED"}}
+    assert seats_left(db, onward_id) == 120
+    assert seats_left(db, return_id) == 120
+
+
+def test_paid_onward_legs_become_partially_cancelled(db, client, auth_headers, monkeypatch):
+    onward_id, return_id = same_airline_pair(db)
+    pnr = book_roundtrip(client, auth_headers, onward_id, return_id)["onward_pnr"]
+    monkeypatch.setattr(main.random, "random", lambda: 0.0)
+    client.post(f"/bookings/{pnr}/pay", headers=auth_headers(1))
+
+    resp = client.post(f"/bookings/{pnr}/cancel", params={"leg": "return"}, headers=auth_headers(1))
+    assert resp.status_code == 200
+    assert leg_statuses(db, pnr) == {False: {"PARTIALLY_CANCELLED"}, True: {"CANCELLED"}}
+    assert seats_left(db, onward_id) == 118
+
+
+@pytest.mark.parametrize("passengers", [1, 9])
+def test_cancel_and_lookup_run_a_fixed_number_of_statements(db, client, auth_headers, count_queries, passengers):
+    resp = client.post("/bookings/oneway", headers=auth_headers(1), json={
+        "owner_passenger_id": 1,
+        "onward_flight_id": 1,
+        "passengers": [{"full_name": f"P{i}"} for i in range(passengers)],
+    })
+    pnr = resp.json()["shared_pnr"]
+    with count_queries() as statements:
+        resp = client.post(f"/bookings/{pnr}/cancel", headers=auth_headers(1))
+    assert resp.json()["cancelled_count"] == passengers
+    assert len(statements) == 6, statements
+
+    # flights 1 and 16 belong to different airlines: the return leg has a PNR of its own
+    booking = book_roundtrip(client, auth_headers, 1, 16, passengers)
+    onward_pnr, return_pnr = booking["onward_pnr"], booking["return_pnr"]
+    with count_queries() as statements:
+        resp = client.post(f"/bookings/{return_pnr}/cancel", params={"leg": "return"}, headers=auth_headers(1))
+    assert resp.json()["cancelled_count"] == passengers
+    assert len(statements) == 7, statements
+
+    client.get(f"/bookings/{onward_pnr}", headers=auth_headers(1))  # warm the reference cache
+    with count_queries(database.async_engine) as statements:
+        resp = client.get(f"/bookings/{onward_pnr}", headers=auth_headers(1))
+    assert resp.status_code == 200
+    assert len(statements) == 3, statements
+
+
+def test_bookings_charge_the_price_shown(db, client, auth_headers):
+    # a fresh market snapshot well away from what the pricing formula gives right now
+    flight = db.get(models.Flight, 1)
+    flight.current_price = 9999.0
+    flight.price_updated_at = datetime.utcnow()
+    db.commit()
+    shown = client.get("/flights/1").json()["dynamic_price"]
+    assert shown == 9999.0
+
+    resp = client.post("/bookings/oneway", headers=auth_headers(1), json={
+        "owner_passenger_id": 1, "onward_flight_id": 1, "passengers": [{"full_name": "A"}],
+    })
+    assert resp.status_code == 201, resp.text
+    db.expire_all()
+    fares = {float(b.fare_paid) for b in db.query(models.Booking).filter(models.Booking.flight_id == 1)}
+    assert fares == {shown}
@@ -0,0 +1,62 @@
+# tests/test_concurrency.py
+import threading
+from collections import Counter
+from sqlalchemy import func, select
+import models
+
+SEATS = 10
+THREADS = 24
+
+
+def test_concurrent_bookings_never_oversell(db, client, auth_headers):
+    """
+    Threads race one-way and round-trip bookings for the last seats of two flights;
+    every seat taken must belong to exactly one booking and none may be sold twice.
+    """
+    onward_id, return_id = 1, 16
+    db.query(models.Flight).filter(models.Flight.flight_id.in_([onward_id, return_id])).update(
+        {"total_seats": SEATS, "available_seats": SEATS}, synchronize_session=False
+    )
+    db.commit()
+    headers = auth_headers(1)
+    codes = Counter()
+    errors = []
+
+    def book(i: int):
+        passengers = [{"full_name": f"P{i}-{n}"} for n in range(1 + i % 2)]
+        if i % 3:
+            resp = client.post("/bookings/oneway", headers=headers, json={
+                "owner_passenger_id": 1, "onward_flight_id": onward_id, "passengers": passengers,
+            })
+        else:
+            resp = client.post("/bookings/roundtrip", headers=headers, json={
+                "owner_passenger_id": 1, "onward_flight_id": onward_id, "return_flight_id": return_id,
+                "passengers": passengers,
+            })
+        codes[resp.status_code] += 1
+        if resp.status_code not in (200, 201, 409):
+            errors.append(resp.text)
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors, errors
+    assert codes[409], "the flights never sold out"
+    db.expire_all()
+    for flight_id in (onward_id, return_id):
+        flight = db.get(models.Flight, flight_id)
+        booked = db.execute(
+            select(func.count()).select_from(models.Booking)
+            .where(models.Booking.flight_id == flight_id)
+            .where(models.Booking.status == "PENDING_PAYMENT")
+        ).scalar_one()
+        claimed = db.execute(
+            select(models.FlightSeat.seat_no).where(models.FlightSeat.flight_id == flight_id)
+            .where(models.FlightSeat.pnr.isnot(None))
+        ).scalars().all()
+        assert flight.available_seats >= 0
+        assert booked == len(claimed) == flight.total_seats - flight.available_seats
+        assert len(set(claimed)) == len(claimed)
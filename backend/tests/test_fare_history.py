@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert, func, select
+import fare_history, models
+
+
+def write_points(db, flight_id: int, days: int, now: datetime) -> int:
+    """
+    One fare point every 30 minutes for `days` days up to `now`; returns the count.
+    """
+    first = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    rows = []
+    ts = first
+    while ts < now:
+        rows.append({"flight_id": flight_id, "recorded_at": ts, "price": 5000 + len(rows) % 97})
+        ts += timedelta(minutes=30)
+    db.execute(insert(models.FareHistory.__table__), rows)
+    db.commit()
+    return len(rows)
+
+
+def all_pages(client, flight_id: int, params: dict) -> list:
+    items, cursor = [], None
+    for _ in range(1000):
+        page = client.get(f"/flights/{flight_id}/fares", params=dict(params, **({"cursor": cursor} if cursor else {})))
+        assert page.status_code == 200, page.text
+        body = page.json()
+        items.extend(body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items
+    raise AssertionError("pagination did not terminate")
+
+
+@pytest.mark.parametrize("days", [20, 120])  # hourly rollups only / daily and hourly rollups
+@pytest.mark.parametrize("bucket,limit", [("day", 3), ("day", 30), ("hour", 50)])
+def test_fare_buckets_page_across_rollup_boundary(client, db, days, bucket, limit):
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    written = write_points(db, 1, days, now)
+    fare_history.rollup_fare_history(now)
+    assert db.execute(select(func.count()).select_from(models.FareHistoryRollup)).scalar() > 0
+
+    params = {"bucket": bucket, "limit": limit,
+              "start": (now - timedelta(days=days + 1)).isoformat(), "end": (now + timedelta(hours=1)).isoformat()}
+    items = all_pages(client, 1, params)
+
+    assert sum(i["samples"] for i in items) == written
+    starts = [i["bucket_start"] for i in items]
+    assert starts == sorted(starts) and len(set(starts)) == len(starts)
+    if bucket == "day":
+        # one bucket per calendar day touched by the points, none missing
+        first = (now - timedelta(days=days)).date()
+        assert [s[:10] for s in starts] == [(first + timedelta(days=d)).isoformat() for d in range(len(starts))]
+        assert starts[-1][:10] == now.date().isoformat()
+
+
+@pytest.mark.parametrize("params", [
+    {"start": "2026-10-10T00:00:00Z"},
+    {"end": "2099-01-01T05:30:00+05:30"},
+    {"start": "2026-10-10T00:00:00+02:00", "end": "2099-01-01T00:00:00"},
+])
+def test_timezone_aware_range_is_read_as_utc(db, client, params):
+    resp = client.get("/flights/1/fares", params=params)
+    assert resp.status_code == 200, resp.text
@@ -0,0 +1,137 @@
+# tests/test_inventory.py
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+import inventory, market, models, pricing
+
+
+def book_oneway(client, headers, flight_id: int, passengers: int = 2) -> str:
+    resp = client.post("/bookings/oneway", headers=headers(1), json={
+        "owner_passenger_id": 1,
+        "onward_flight_id": flight_id,
+        "passengers": [{"full_name": f"P{i}"} for i in range(passengers)],
+    })
+    assert resp.status_code == 201, resp.text
+    return resp.json()["shared_pnr"]
+
+
+def seat_holders(db, flight_id: int) -> list:
+    return db.execute(
+        select(models.FlightSeat.pnr).where(models.FlightSeat.flight_id == flight_id)
+    ).scalars().all()
+
+
+def assert_in_step(db, flight_id: int):
+    db.expire_all()
+    flight = db.get(models.Flight, flight_id)
+    holders = seat_holders(db, flight_id)
+    assert len(holders) == flight.total_seats
+    assert sum(pnr is not None for pnr in holders) == flight.total_seats - flight.available_seats
+
+
+def test_seat_rows_start_with_seats_sold_before_they_existed(db, client, auth_headers):
+    pnr = book_oneway(client, auth_headers, 1)
+    holders = seat_holders(db, 1)
+    assert holders.count(inventory.MARKET_PNR) == 150 - 120
+    assert holders.count(pnr) == 2
+    assert_in_step(db, 1)
+
+    seats = client.get("/flights/1/seats").json()
+    assert len(seats["unavailableSeats"]) == 32
+
+
+def test_market_simulation_moves_real_seat_rows(db, client, auth_headers, monkeypatch):
+    pnrs = {fid: book_oneway(client, auth_headers, fid) for fid in (1, 2, 3)}
+
+    def busy_market(rng, available, total):
+        # every flight sells or releases a couple of seats each tick
+        return rng.choice([-2, -1, 1, 2], size=len(available))
+
+    monkeypatch.setattr(market, "simulate_seat_changes", busy_market)
+    start = datetime.utcnow()
+    for tick in range(20):
+        db_tick = market.SessionLocal()
+        try:
+            market.simulate_shard(db_tick, pricing.PricingContext(now=start + timedelta(seconds=tick)), 0, 1000)
+        finally:
+            db_tick.close()
+
+    for fid, pnr in pnrs.items():
+        assert_in_step(db, fid)
+        assert seat_holders(db, fid).count(pnr) == 2  # simulated releases never free a booking's seat
+    # flights nobody booked still move on the counter alone
+    db.expire_all()
+    untouched = db.execute(
+        select(func.count()).select_from(models.Flight)
+        .where(models.Flight.flight_id > 3).where(models.Flight.available_seats != 120)
+    ).scalar_one()
+    assert untouched
+
+
+def taken_from_bitmap(payload: dict) -> set:
+    bits = base64.b64decode(payload["taken"])
+    return {i for i in range(payload["total_seats"]) if bits[i >> 3] >> (i & 7) & 1}
+
+
+def test_unbooked_seat_maps_agree_with_available_seats(db, client, auth_headers):
+    seats = client.get("/flights/1/seats").json()
+    assert len(seats["unavailableSeats"]) == 150 - seats["available_seats"] == 30
+    assert len(seats["available_seat_numbers"]) == 120
+    bitmap = client.get("/flights/1/seatmap").json()
+    labels = inventory.seat_labels(150)
+    assert {labels[i] for i in taken_from_bitmap(bitmap)} == set(seats["unavailableSeats"])
+
+    # seats shown free can be booked, and the seats shown taken stay taken
+    chosen = seats["available_seat_numbers"][:2]
+    resp = client.post("/bookings/oneway", headers=auth_headers(1), json={
+        "owner_passenger_id": 1,
+        "onward_flight_id": 1,
+        "passengers": [{"full_name": f"P{i}", "seat_no": seat} for i, seat in enumerate(chosen)],
+    })
+    assert resp.status_code == 201, resp.text
+    after = client.get("/flights/1/seats").json()
+    assert set(after["unavailableSeats"]) == set(seats["unavailableSeats"]) | set(chosen)
+
+
+def test_explicit_seats_are_never_presold(db, client, auth_headers):
+    for flight_id in range(1, 37):
+        resp = client.post("/bookings/oneway", headers=auth_headers(1), json={
+            "owner_passenger_id": 1,
+            "onward_flight_id": flight_id,
+            "passengers": [{"full_name": "A", "seat_no": "1A"}, {"full_name": "B", "seat_no": "1B"}],
+        })
+        assert resp.status_code == 201, resp.text
+        assert_in_step(db, flight_id)
+
+
+def test_seatmap_delta_from_version_zero_includes_seeded_seats(db, client, auth_headers):
+    before = client.get("/flights/1/seatmap").json()
+    assert before["version"] == 0
+    # the market sells seats while the flight still has no seat rows
+    db.query(models.Flight).filter(models.Flight.flight_id == 1).update({"available_seats": 115})
+    db.commit()
+    book_oneway(client, auth_headers, 1)
+
+    full = client.get("/flights/1/seatmap").json()
+    delta = client.get("/flights/1/seatmap", params={"since": before["version"]}).json()
+    taken = taken_from_bitmap(before)
+    for change in delta["changes"]:
+        (taken.add if change["taken"] else taken.discard)(change["index"])
+    assert taken == taken_from_bitmap(full)
+    assert len(taken) == 150 - 115 + 2
+
+
+def test_market_shard_moves_seat_rows_in_a_fixed_number_of_statements(db, client, auth_headers, count_queries, monkeypatch):
+    for fid in range(1, 37):
+        book_oneway(client, auth_headers, fid, passengers=1)
+    monkeypatch.setattr(market, "simulate_seat_changes", lambda rng, available, total: rng.choice([-2, 2], size=len(available)))
+
+    db_tick = market.SessionLocal()
+    try:
+        with count_queries() as statements:
+            market.simulate_shard(db_tick, pricing.PricingContext(), 0, 1000)
+    finally:
+        db_tick.close()
+    assert len(statements) <= 9, statements
+    for fid in range(1, 37):
+        assert_in_step(db, fid)
@@ -0,0 +1,59 @@
+# tests/test_pnr_allocator.py
+import multiprocessing
+import threading
+from sqlalchemy import create_engine
+import database, models, pnr_allocator
+
+PROCESSES = 6
+THREADS = 3
+PER_THREAD = 150
+BLOCK_SIZE = 25  # small, so blocks are reserved concurrently all the time
+
+
+def allocate(db_url: str, queue):
+    """
+    One worker process: several threads drawing PNRs from a shared small-block allocator.
+    """
+    pnr_allocator.engine = create_engine(db_url, connect_args={"timeout": 30})
+    allocator = pnr_allocator.PnrAllocator(block_size=BLOCK_SIZE)
+    issued = []
+
+    def run():
+        for _ in range(PER_THREAD):
+            issued.append(allocator.next())
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    queue.put(issued)
+
+
+def test_pnrs_are_unique_across_processes():
+    models.PnrSequence.__table__.drop(database.engine, checkfirst=True)
+    models.PnrSequence.__table__.create(database.engine)
+    database.engine.dispose()
+
+    # spawn, not fork, as in production (see hashing.HashingPool)
+    mp = multiprocessing.get_context("spawn")
+    queue = mp.Queue()
+    workers = [mp.Process(target=allocate, args=(str(database.engine.url), queue)) for _ in range(PROCESSES)]
+    for w in workers:
+        w.start()
+    issued = [pnr for _ in workers for pnr in queue.get(timeout=120)]
+    for w in workers:
+        w.join(timeout=30)
+        assert w.exitcode == 0
+
+    assert len(issued) == PROCESSES * THREADS * PER_THREAD
+    assert len(set(issued)) == len(issued)
+    assert all(pnr_allocator.is_valid_pnr(pnr) for pnr in issued)
+
+
+def test_check_symbol_catches_single_substitutions():
+    pnr = pnr_allocator.encode_pnr(12345)
+    for i, original in enumerate(pnr):
+        for c in pnr_allocator.ALPHABET:
+            if c != original:
+                assert not pnr_allocator.is_valid_pnr(pnr[:i] + c + pnr[i + 1:])
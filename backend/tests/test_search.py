@@ -0,0 +1,72 @@
+# tests/test_search.py
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+import database, models
+
+
+def captured_selects(client, url: str) -> list:
+    """
+    (statement, parameters) of every SELECT on the flights table run while serving `url`.
+    """
+    seen = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and " flights" in statement:
+            seen.append((statement, parameters))
+
+    engine = database.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return seen
+
+
+def test_route_search_uses_route_departure_index(db, client):
+    day = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+    selects = captured_selects(client, f"/search?origin=Delhi&destination=Mumbai&travel_date={day}")
+    assert len(selects) == 1
+    statement, parameters = selects[0]
+
+    with database.engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    details = " | ".join(row[-1] for row in plan)
+    assert "ix_flights_route_departure" in details, details
+    # the travel_date range is part of the index search, not a filter applied afterwards
+    assert "departure_time>?" in details, details
+
+
+def test_unfiltered_price_sort_reads_one_page(db, client):
+    selects = captured_selects(client, "/search?sort_by=price&limit=5")
+    assert len(selects) == 1
+    statement, parameters = selects[0]
+    assert "LIMIT" in statement.upper() and 6 in parameters
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_price_sort_follows_the_price_shown(db, client, order):
+    now = datetime.utcnow()
+    for flight in db.query(models.Flight):
+        if flight.flight_id % 3 == 0:
+            continue  # never priced: shown at a freshly computed price
+        # stale snapshots are far off the price that is shown for them
+        stale = flight.flight_id % 3 == 1
+        flight.current_price = 1 if stale else float(flight.base_fare) * 1.5
+        flight.price_updated_at = now - timedelta(days=1) if stale else now
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        resp = client.get("/search", params={
+            "origin": "Delhi", "sort_by": "price", "order": order, "limit": 3, "cursor": cursor,
+        })
+        page = [f["dynamic_price"] for f in resp.json()]
+        assert page == sorted(page, reverse=order == "desc")
+        seen.extend(f["flight_id"] for f in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    from_delhi = db.query(models.Flight.flight_id).filter(models.Flight.source_airport == 1)
+    assert sorted(seen) == sorted(f for f, in from_delhi) and len(seen) > 3
@@ -1,35 +1,20 @@
 # utils.py
-import random
-import string
-import time
+import base64
+import json
+import os
+from datetime import datetime, timezone
 from passlib.context import CryptContext
 
 
-# -------------------------
-# PNR generation
-# -------------------------
-
-def generate_pnr(length: int = 8) -> str:
-    """
-    Generate a unique PNR code consisting of uppercase letters and digits.
-    """
-    alphabet = string.ascii_uppercase + string.digits
-    return "".join(random.choices(alphabet, k=length))
-
-def generate_unique_pnr(length: int = 8) -> str:
-    """
-    Generate a unique PNR quickly without querying the database.
-    Combines random characters + timestamp to minimize collision risk.
-    """
-    timestamp_part = int(time.time() * 1000)  # milliseconds since epoch
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-    return f"{random_part}{timestamp_part}"[:12]  # truncate to max 12 chars
 # -------------------------
 # Password hashing utils
 # -------------------------
 
+# bcrypt cost factor; hashes made with a different one are upgraded at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 # Using bcrypt (72-byte limit)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 # Alternatively, for longer passwords, you can use argon2:
 # pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
@@ -46,4 +31,55 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Verify that a plain text password matches the hashed password.
     """
     truncated_password = plain_password[:72]  # <-- keep it as a string
-    return pwd_context.verify(truncated_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(truncated_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple:
+    """
+    Verify a password; also returns a fresh hash when the stored one is outdated.
+    Returns (valid, new hash or None).
+    """
+    truncated_password = plain_password[:72]  # <-- keep it as a string
+    try:
+        return pwd_context.verify_and_update(truncated_password, hashed_password)
+    except ValueError:  # not a hash we recognise
+        return False, None
+
+
+# -------------------------
+# Pagination cursors
+# -------------------------
+
+def encode_cursor(*values) -> str:
+    """
+    Encode a keyset position (e.g. sort key + primary key) as an opaque URL-safe token.
+    Datetimes are preserved.
+    """
+    payload = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    """
+    Decode a token produced by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(payload, list):
+        raise ValueError("Invalid cursor")
+    return [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) and "dt" in v else v for v in payload]
+
+
+# -------------------------
+# Datetimes
+# -------------------------
+def naive_utc(value: datetime):
+    """
+    Timezone-aware datetimes converted to naive UTC, the form the database columns use;
+    naive ones are taken to be UTC already.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -24,6 +24,9 @@ CREATE TABLE IF NOT EXISTS airports (
     city VARCHAR(50),
     country VARCHAR(50)
 );
+ALTER TABLE airports
+ADD COLUMN iata_code VARCHAR(3) UNIQUE AFTER airport_name;
+CREATE INDEX ix_airports_city ON airports (city);
 
 -- Flights
 CREATE TABLE IF NOT EXISTS flights (
@@ -46,6 +49,20 @@ ADD COLUMN current_price FLOAT DEFAULT 0;
 ALTER TABLE flights
 ADD COLUMN flight_type ENUM('DOMESTIC', 'INTERNATIONAL') DEFAULT 'DOMESTIC',
 ADD COLUMN travel_date DATE;
+-- Latest price published by the market simulator (served by read endpoints while fresh)
+ALTER TABLE flights
+ADD COLUMN price_updated_at DATETIME NULL;
+-- Bumped on every seat claim / release; drives seat map ETags and deltas
+ALTER TABLE flights
+ADD COLUMN seat_map_version INT NOT NULL DEFAULT 0;
+-- Row version for optimistic seat-count updates (bumped whenever available_seats changes)
+ALTER TABLE flights
+ADD COLUMN version INT NOT NULL DEFAULT 0;
+
+-- Search indexes: route + half-open departure_time range
+CREATE INDEX ix_flights_route_departure ON flights (source_airport, destination_airport, departure_time);
+CREATE INDEX ix_flights_destination_departure ON flights (destination_airport, departure_time);
+CREATE INDEX ix_flights_departure_time ON flights (departure_time);
 
 
 -- Passengers
@@ -86,6 +103,9 @@ ALTER TABLE bookings
 ADD INDEX (pnr);
 ALTER TABLE bookings
 ADD COLUMN is_return_leg BOOLEAN DEFAULT FALSE AFTER return_flight_id;
+-- Seat hold deadline for PENDING_PAYMENT bookings (released by the hold reaper)
+ALTER TABLE bookings ADD COLUMN hold_expires_at DATETIME NULL;
+CREATE INDEX ix_bookings_hold_expires_at ON bookings (hold_expires_at);
 
 
 
@@ -103,6 +123,39 @@ ALTER TABLE booking_passengers ADD COLUMN return_seat_no VARCHAR(5) NULL;
 ALTER TABLE booking_passengers ADD CONSTRAINT uq_booking_seat UNIQUE (booking_id, seat_no);
 
 
+-- Seat inventory: one row per seat, created on a flight's first booking
+CREATE TABLE IF NOT EXISTS flight_seats (
+    flight_id INT NOT NULL,
+    seat_no VARCHAR(5) NOT NULL,
+    seat_index INT NOT NULL,
+    pnr VARCHAR(12) NULL,
+    claimed_at DATETIME NULL,
+    version INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (flight_id, seat_no),
+    FOREIGN KEY (flight_id) REFERENCES flights(flight_id)
+);
+CREATE INDEX ix_flight_seats_flight_index ON flight_seats (flight_id, seat_index);
+CREATE INDEX ix_flight_seats_flight_pnr ON flight_seats (flight_id, pnr);
+CREATE INDEX ix_flight_seats_flight_version ON flight_seats (flight_id, version);
+
+
+-- PNR sequence: workers reserve blocks of numbers from it, see backend/pnr_allocator.py
+CREATE TABLE IF NOT EXISTS pnr_sequence (
+    name VARCHAR(32) PRIMARY KEY,
+    next_value BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO pnr_sequence (name, next_value) VALUES ('pnr', 0);
+
+
+-- Access tokens logged out before they expire (polled by every API worker)
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    jti VARCHAR(32) NOT NULL UNIQUE,
+    expires_at BIGINT NOT NULL,
+    INDEX ix_revoked_tokens_expires_at (expires_at)
+);
+
+
 -- Fare history
 CREATE TABLE IF NOT EXISTS fare_history (
   id INT AUTO_INCREMENT PRIMARY KEY,
@@ -111,12 +164,31 @@ CREATE TABLE IF NOT EXISTS fare_history (
   price DECIMAL(12,2),
   FOREIGN KEY (flight_id) REFERENCES flights(flight_id)
 );
+CREATE INDEX ix_fare_history_flight_recorded ON fare_history (flight_id, recorded_at);
+
+-- Downsampled fare history (hourly / daily buckets rolled up from fare_history)
+CREATE TABLE IF NOT EXISTS fare_history_rollup (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  flight_id INT NOT NULL,
+  granularity VARCHAR(4) NOT NULL,
+  bucket_start DATETIME NOT NULL,
+  open_price DECIMAL(12,2),
+  close_price DECIMAL(12,2),
+  min_price DECIMAL(12,2),
+  max_price DECIMAL(12,2),
+  avg_price DECIMAL(12,2),
+  samples INT DEFAULT 0,
+  CONSTRAINT uq_fare_rollup_bucket UNIQUE (flight_id, granularity, bucket_start),
+  FOREIGN KEY (flight_id) REFERENCES flights(flight_id)
+);
 
 -- ==============================
 --  SAMPLE DATA
 -- ==============================
 
 -- Clear old data (optional for testing)
+DELETE FROM fare_history_rollup;
+DELETE FROM flight_seats;
 DELETE FROM fare_history;
 DELETE FROM bookings;
 DELETE FROM flights;
@@ -140,17 +212,17 @@ INSERT INTO airlines (airline_name, iata_code) VALUES
 -- ==============================
 --  AIRPORTS
 -- ==============================
-INSERT INTO airports (airport_name, city, country) VALUES
-('Indira Gandhi International Airport', 'Delhi', 'India'),
-('Chhatrapati Shivaji International Airport', 'Mumbai', 'India'),
-('Kempegowda International Airport', 'Bangalore', 'India'),
-('Netaji Subhas Chandra Bose International Airport', 'Kolkata', 'India'),
-('Chennai International Airport', 'Chennai', 'India'),
-('Rajiv Gandhi International Airport', 'Hyderabad', 'India'),
-('Cochin International Airport', 'Kochi', 'India'),
-('Pune International Airport', 'Pune', 'India'),
-('Jaipur International Airport', 'Jaipur', 'India'),
-('Sardar Vallabhbhai Patel International Airport', 'Ahmedabad', 'India');
+INSERT INTO airports (airport_name, iata_code, city, country) VALUES
+('Indira Gandhi International Airport', 'DEL', 'Delhi', 'India'),
+('Chhatrapati Shivaji International Airport', 'BOM', 'Mumbai', 'India'),
+('Kempegowda International Airport', 'BLR', 'Bangalore', 'India'),
+('Netaji Subhas Chandra Bose International Airport', 'CCU', 'Kolkata', 'India'),
+('Chennai International Airport', 'MAA', 'Chennai', 'India'),
+('Rajiv Gandhi International Airport', 'HYD', 'Hyderabad', 'India'),
+('Cochin International Airport', 'COK', 'Kochi', 'India'),
+('Pune International Airport', 'PNQ', 'Pune', 'India'),
+('Jaipur International Airport', 'JAI', 'Jaipur', 'India'),
+('Sardar Vallabhbhai Patel International Airport', 'AMD', 'Ahmedabad', 'India');
 
 SELECT * FROM airlines;
 SELECT * FROM airports;